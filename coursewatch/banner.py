@@ -1,22 +1,34 @@
 import asyncio
 import bisect
+import codecs
 import datetime
-import operator
+import html.parser
 import contextlib
-from . import logutil, constants, http
+import aiohttp
+import chardet
+from . import logutil, constants, http, cache, runtime, metrics, policy, \
+    scheduler
 from collections import namedtuple
-from googleapiclient.discovery import build as gapi_build
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
 
 logger = logutil.get_logger(__name__)
 
-_gapi_cse_service = None
-_gapi_cse_id = None
+_autodiscovery_cache = None
+_autodiscovery_in_flight = {}
+_cse_params = None
+_cse_base_url = None
+_autodiscovery_positive_ttl = None
+_autodiscovery_negative_ttl = None
+_probe_timeout = None
+_probe_concurrency = None
+_cse_timeout = None
 
 ClassInfo = namedtuple('ClassInfo', ('name', 'crn', 'id', 'section',
                                      'seat_cap', 'seat_act', 'seat_rem',
                                      'wait_cap', 'wait_act', 'wait_rem'))
+SectionListing = namedtuple('SectionListing', ('name', 'crn', 'id',
+                                               'section'))
 CalendarMonth = namedtuple('CalendarMonth', ('year', 'month'))
 
 
@@ -34,34 +46,75 @@ class AsyncContextManagerShield:
         return False
 
 
-def gapi_init(gapi_key, gapi_cse_id):
-    global _gapi_cse_service
-    global _gapi_cse_id
-    _gapi_cse_service = gapi_build('customsearch', 'v1',
-                                   developerKey=gapi_key,
-                                   cache_discovery=False)
-    _gapi_cse_id = gapi_cse_id
+def autodiscovery_init(gapi_key, gapi_cse_id, base_url, positive_ttl,
+                       negative_ttl, cache_size, probe_timeout,
+                       probe_concurrency, cse_timeout):
+    global _autodiscovery_cache
+    global _cse_params
+    global _cse_base_url
+    global _autodiscovery_positive_ttl
+    global _autodiscovery_negative_ttl
+    global _probe_timeout
+    global _probe_concurrency
+    global _cse_timeout
+    _cse_params = {'key': gapi_key, 'cx': gapi_cse_id}
+    _cse_base_url = base_url
+    _autodiscovery_positive_ttl = positive_ttl
+    _autodiscovery_negative_ttl = negative_ttl
+    _autodiscovery_cache = cache.LRUCache(cache_size)
+    _probe_timeout = probe_timeout
+    _probe_concurrency = probe_concurrency
+    _cse_timeout = aiohttp.ClientTimeout(total=cse_timeout)
 
 
-def autodiscover_sync(school_name):
+async def search_banner_url(school_name):
+    params = dict(_cse_params)
+    params.update({
+        'q': 'inurl:{0!s}'.format(constants.BANNER_TEST_PATH),
+        'siteSearch': school_name,
+        'num': '1',
+        'fields': 'items/link',
+    })
+    session = http.get_shared_session()
+    async with session.get(_cse_base_url, params=params,
+                           timeout=_cse_timeout) as resp:
+        resp.raise_for_status()
+        result = await resp.json()
     try:
-        return urljoin(_gapi_cse_service.cse().list(
-            q='inurl:{0!s}'.format(constants.BANNER_TEST_PATH),
-            siteSearch=school_name,
-            num=1,
-            cx=_gapi_cse_id,
-            fields='items/link'
-        ).execute()['items'][0]['link'], '.')
+        return urljoin(result['items'][0]['link'], '.')
     except (KeyError, IndexError):
-        pass
-    except Exception:
-        logger.exception('failed to autodiscover Banner for school {0!s}',
-                         school_name)
+        return None
+
+
+async def _autodiscover_uncached(school_name):
+    url = await probe(school_name)
+    if url is None:
+        try:
+            url = await search_banner_url(school_name)
+        except asyncio.TimeoutError:
+            logger.warning(constants.LOG_MSG_CSE_TIMEOUT, school_name)
+        except Exception:
+            logger.exception('failed to autodiscover Banner for school '
+                             '{0!s}', school_name)
+    ttl = (_autodiscovery_negative_ttl if url is None
+           else _autodiscovery_positive_ttl)
+    _autodiscovery_cache.set(school_name, url, ttl=ttl)
+    return url
 
 
 async def autodiscover(school_name):
-    return await asyncio.get_event_loop().run_in_executor(
-        None, autodiscover_sync, school_name)
+    try:
+        return _autodiscovery_cache[school_name]
+    except KeyError:
+        pass
+    try:
+        future = _autodiscovery_in_flight[school_name]
+    except KeyError:
+        future = asyncio.ensure_future(_autodiscover_uncached(school_name))
+        _autodiscovery_in_flight[school_name] = future
+        future.add_done_callback(
+            lambda _: _autodiscovery_in_flight.pop(school_name, None))
+    return await asyncio.shield(future)
 
 
 async def test_url(url):
@@ -71,6 +124,51 @@ async def test_url(url):
             return resp.status == 200
 
 
+def generate_candidate_urls(school_name):
+    for prefix in constants.BANNER_PROBE_HOST_PREFIXES:
+        host = '.'.join(filter(None, (prefix, school_name)))
+        for path in constants.BANNER_PROBE_PATHS:
+            yield 'https://{0!s}{1!s}'.format(host, path)
+
+
+async def probe_url(url, session, semaphore):
+    timeout = aiohttp.ClientTimeout(total=_probe_timeout)
+    async with semaphore:
+        try:
+            async with session.get(urljoin(url, constants.BANNER_TEST_PATH),
+                                   allow_redirects=False,
+                                   timeout=timeout) as resp:
+                if resp.status != 200:
+                    return None
+                html = await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+    if constants.BANNER_PROBE_MARKER not in html:
+        return None
+    return url
+
+
+async def probe(school_name):
+    session = http.get_shared_session()
+    semaphore = asyncio.Semaphore(_probe_concurrency)
+    pending = {asyncio.ensure_future(probe_url(url, session, semaphore))
+               for url in generate_candidate_urls(school_name)}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = task.result()
+                if url is not None:
+                    logger.info(constants.LOG_MSG_BANNER_URL_PROBE_SUCCESS,
+                                school_name, url)
+                    return url
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
 def get_default_term():
     now = datetime.datetime.now(tz=datetime.timezone.utc)
     this_month = CalendarMonth(now.year, now.month)
@@ -85,7 +183,114 @@ def get_default_term():
     )
 
 
-async def get_class_info(base_url, crn, term=None, session=None):
+def is_term_over(term):
+    try:
+        end_month = constants.BANNER_TERM_END_MONTHS[term % 100]
+    except KeyError:
+        return False
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    return CalendarMonth(term // 100, end_month) < CalendarMonth(now.year,
+                                                                 now.month)
+
+
+class SeatTableParser(html.parser.HTMLParser):
+    SEAT_CELLS = 6
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.details = None
+        self.seat_cells = []
+        self._default_cells = 0
+        self._capture = None
+        self._capture_end = None
+
+    @property
+    def done(self):
+        return (self.details is not None
+                and len(self.seat_cells) >= type(self).SEAT_CELLS)
+
+    def handle_starttag(self, tag, attrs):
+        if self._capture is not None or self.done:
+            return
+        classes = dict(attrs).get('class', '') or ''
+        classes = classes.split()
+        if 'ddlabel' in classes and self.details is None:
+            self._capture = []
+            self._capture_end = ('details', tag)
+        elif 'dddefault' in classes:
+            self._default_cells += 1
+            if self._default_cells > 1:
+                self._capture = []
+                self._capture_end = ('seats', tag)
+
+    def handle_endtag(self, tag):
+        if self._capture is None or tag != self._capture_end[1]:
+            return
+        target, _ = self._capture_end
+        text = ''.join(self._capture).strip()
+        self._capture = None
+        self._capture_end = None
+        if target == 'details':
+            self.details = text
+        else:
+            self.seat_cells.append(text)
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._capture.append(data)
+
+
+def get_decoder(resp, data):
+    encoding = resp.charset
+    if encoding is None:
+        # like ClientResponse.get_encoding(), but only sniffs the start of
+        # the body since the rest has not been read yet
+        encoding = (chardet.detect(data)['encoding']
+                    or constants.BANNER_DEFAULT_ENCODING)
+    try:
+        return codecs.getincrementaldecoder(encoding)('replace')
+    except LookupError:
+        return codecs.getincrementaldecoder(
+            constants.BANNER_DEFAULT_ENCODING)('replace')
+
+
+async def read_seat_table(resp):
+    decoder = None
+    buffered = b''
+    parser = SeatTableParser()
+    # aiohttp has already decompressed the body, so this counts decoded bytes
+    # rather than bytes on the wire
+    bytes_read = 0
+    try:
+        async for chunk in resp.content.iter_chunked(
+                constants.BANNER_STREAM_CHUNK_SIZE):
+            bytes_read += len(chunk)
+            if decoder is None:
+                buffered += chunk
+                if (resp.charset is None and len(buffered)
+                        < constants.BANNER_ENCODING_SNIFF_SIZE):
+                    continue
+                decoder = get_decoder(resp, buffered)
+                chunk, buffered = buffered, b''
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                metrics.increment('banner.detail_early_closes')
+                resp.close()
+                break
+        else:
+            if decoder is None:
+                decoder = get_decoder(resp, buffered)
+            parser.feed(decoder.decode(buffered, final=True))
+            parser.close()
+    finally:
+        metrics.increment('banner.detail_decoded_bytes_read', bytes_read)
+        metrics.histogram('banner.detail_decoded_bytes',
+                          constants.METRICS_BYTE_BOUNDS).observe(bytes_read)
+    return parser
+
+
+async def get_class_info(base_url, crn, term=None, session=None,
+                         priority=None):
     try:
         if crn == constants.TEST_CLASS_CRN:
             minute = datetime.datetime.now().minute
@@ -101,22 +306,87 @@ async def get_class_info(base_url, crn, term=None, session=None):
         url = urljoin(base_url, constants.BANNER_DETAILS_PATH)
         params = {'term_in': str(term), 'crn_in': str(crn).rjust(5, '0')}
         async with session_cm as session:
-            async with session.get(url, params=params) as resp:
-                html = await resp.text()
-        soup = BeautifulSoup(html, 'html.parser')
-        details_tag = soup.find(class_='ddlabel')
-        if details_tag is None:
+            async def fetch(timeout):
+                async with session.get(
+                        url, params=params, timeout=timeout,
+                        headers=constants.BANNER_REQUEST_HEADERS) as resp:
+                    policy.check_status(resp)
+                    return await read_seat_table(resp)
+            parser = await policy.run(base_url, fetch, priority)
+        if parser.details is None:
             return None
-        details = details_tag.get_text(strip=True).rsplit(' - ', 3)
+        details = parser.details.rsplit(' - ', 3)
         name, retrieved_crn, course_id, section = details
         retrieved_crn = int(retrieved_crn)
-        string_getter = operator.attrgetter('string')
-        seat_info_tags = soup.find_all(class_='dddefault')[1:7]
         seat_cap, seat_act, seat_rem, wait_cap, wait_act, wait_rem = \
-            map(int, map(string_getter, seat_info_tags))
+            map(int, parser.seat_cells[:SeatTableParser.SEAT_CELLS])
         return ClassInfo(name, retrieved_crn, course_id, section, seat_cap,
                          seat_act, seat_rem, wait_cap, wait_act, wait_rem)
+    except scheduler.Busy:
+        raise
     except Exception:
         logger.exception('failed to retrieve class info for CRN {0!s} (term '
                          '{1!s}, Banner base URL: {2!s})', crn, term, base_url)
         return None
+
+
+def parse_subjects(html):
+    soup = BeautifulSoup(html, runtime.html_parser)
+    select_tag = soup.find('select', attrs={'name': 'sel_subj'})
+    if select_tag is None:
+        return []
+    return [option['value'] for option in select_tag.find_all('option')
+            if option.get('value')]
+
+
+def parse_section_listing(html):
+    soup = BeautifulSoup(html, runtime.html_parser)
+    sections = []
+    for title_tag in soup.find_all(class_='ddtitle'):
+        try:
+            name, crn, course_id, section = title_tag.get_text(
+                strip=True).rsplit(' - ', 3)
+            sections.append(SectionListing(name, int(crn), course_id,
+                                           section))
+        except ValueError:
+            continue
+    return sections
+
+
+async def get_subjects(base_url, term, session=None, priority=None):
+    session_cm = (AsyncContextManagerShield(session)
+                  or http.create_aiohttp_session())
+    url = urljoin(base_url, constants.BANNER_TERM_DATE_PATH)
+    params = {'p_calling_proc': constants.BANNER_TEST_PATH,
+              'p_term': str(term)}
+    async with session_cm as session:
+        async def fetch(timeout):
+            async with session.get(url, params=params,
+                                   timeout=timeout) as resp:
+                policy.check_status(resp)
+                return await resp.text()
+        html = await policy.run(base_url, fetch, priority)
+    # listing pages are large enough that parsing them would stall the event
+    # loop
+    return await asyncio.get_event_loop().run_in_executor(
+        None, parse_subjects, html)
+
+
+async def get_section_listing(base_url, term, subjects, session=None,
+                              priority=None):
+    session_cm = (AsyncContextManagerShield(session)
+                  or http.create_aiohttp_session())
+    url = urljoin(base_url, constants.BANNER_SECTION_LISTING_PATH)
+    data = [('term_in', str(term))]
+    data.extend(constants.BANNER_SECTION_LISTING_DUMMY_FIELDS)
+    data.extend(('sel_subj', subject) for subject in subjects)
+    data.extend(constants.BANNER_SECTION_LISTING_FIELDS)
+    async with session_cm as session:
+        async def fetch(timeout):
+            async with session.post(url, data=data,
+                                    timeout=timeout) as resp:
+                policy.check_status(resp)
+                return await resp.text()
+        html = await policy.run(base_url, fetch, priority)
+    return await asyncio.get_event_loop().run_in_executor(
+        None, parse_section_listing, html)
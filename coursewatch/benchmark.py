@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from . import logutil, constants, main, loadtest, banner, debounce, replay, \
+    runtime
+from urllib.parse import urljoin
+
+LOG_LEVELS = ('debug', 'info', 'warning')
+LOG_MODES = ('plain', 'json', 'queue', 'json+queue')
+BANNER_URL = 'https://banner.example.edu/pls/PROD/'
+FIRST_CRN = 80000
+
+
+def seed_watched_courses(db, courses, discord_id):
+    with db:
+        db.execute(constants.SQL_ADD_SCHOOL_OR_IGNORE, ('example.edu',))
+        school_id, _, _ = next(db.execute(constants.SQL_GET_SCHOOL_ID_URL,
+                                          ('example.edu',)))
+        db.execute(constants.SQL_SET_SCHOOL_URL, (BANNER_URL, school_id))
+        user_id = db.execute(constants.SQL_ADD_USER,
+                             (discord_id, 0)).lastrowid
+        course_db_ids = []
+        for term, crn in courses:
+            course_db_ids.append(db.execute(constants.SQL_CREATE_CLASS, (
+                school_id, term, crn, constants.TEST_CLASS_NAME,
+                constants.TEST_CLASS_COURSE_ID, constants.TEST_CLASS_SECTION,
+                60, 0, 60, 0, 0, 0)).lastrowid)
+            db.execute(constants.SQL_ADD_TO_WATCHLIST,
+                       (user_id, course_db_ids[-1]))
+    return course_db_ids
+
+
+def reset_logging(listener):
+    if listener is not None:
+        listener.stop()
+    logging.getLogger().handlers.clear()
+
+
+async def watcher_loop(course_db_ids, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for course_db_id in course_db_ids:
+            main.schedule_refresh(course_db_id, 0)
+        await main.watch_iteration()
+    return (time.perf_counter() - start) / iterations
+
+
+def benchmark_logging(args):
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            open(os.devnull, 'w') as devnull:
+        loadtest.configure(os.path.join(temp_dir, 'benchmark.db'))
+        try:
+            main.initialize()
+            user = loadtest.FakeUser(loadtest.USER_ID_BASE, 'user0')
+            client = main.create_client(loop, loadtest.FakeClient)
+            client.add_user(user)
+            # every course is the built-in test class, so no Banner requests
+            # are made
+            course_db_ids = seed_watched_courses(main.db, [
+                (200008 + i * 100, constants.TEST_CLASS_CRN)
+                for i in range(args.courses)], user.id)
+            main.load_watched_courses()
+            print(constants.BENCHMARK_MSG_HEADER.format(
+                'watcher loop', args.courses, args.iterations))
+            for level in LOG_LEVELS:
+                for mode in LOG_MODES:
+                    listener = logutil.configure(
+                        constants.LOG_FORMAT, level=level.upper(),
+                        style=constants.LOG_FORMAT_STYLE,
+                        use_json='json' in mode, use_queue='queue' in mode,
+                        stream=devnull)
+                    try:
+                        elapsed = loop.run_until_complete(watcher_loop(
+                            course_db_ids, args.iterations))
+                    finally:
+                        reset_logging(listener)
+                    print(constants.BENCHMARK_MSG_WATCHER.format(
+                        level, mode, elapsed * 1000,
+                        elapsed * 1e6 / args.courses))
+        finally:
+            loadtest.shutdown(loop)
+
+
+def record_detail_pages(archive_file, term, crns):
+    archive = replay.Archive(archive_file)
+    try:
+        url = urljoin(BANNER_URL, constants.BANNER_DETAILS_PATH)
+        for crn in crns:
+            params = {'term_in': str(term), 'crn_in': str(crn).rjust(5, '0')}
+            # replay alternates between the recorded responses, so every
+            # watcher pass sees the seats change and notifies
+            for seat_rem in (0, 1):
+                archive.record('GET', url, params, None, 200,
+                               {'Content-Type': 'text/html; charset=UTF-8'},
+                               constants.BENCHMARK_DETAIL_PAGE.format(
+                                   crn=crn, seat_act=60 - seat_rem,
+                                   seat_rem=seat_rem).encode(), 0)
+    finally:
+        archive.close()
+
+
+def benchmark_runtime(args):
+    print(constants.BENCHMARK_MSG_HEADER.format(
+        'watcher loop over replayed pages', args.courses, args.iterations))
+    term = banner.get_default_term()
+    crns = [FIRST_CRN + i for i in range(args.courses)]
+    try:
+        for mode in runtime.MODES:
+            enabled, missing = runtime.select(mode)
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            with tempfile.TemporaryDirectory() as temp_dir, \
+                    open(os.devnull, 'w') as devnull:
+                archive_file = os.path.join(temp_dir, 'benchmark.archive')
+                record_detail_pages(archive_file, term, crns)
+                loadtest.configure(os.path.join(temp_dir, 'benchmark.db'),
+                                   http_mode='replay',
+                                   http_archive=archive_file,
+                                   http_replay_speed=0)
+                listener = logutil.configure(
+                    constants.LOG_FORMAT, level=logging.INFO,
+                    style=constants.LOG_FORMAT_STYLE, use_json=True,
+                    json_dumps=runtime.dumps, stream=devnull)
+                try:
+                    main.initialize()
+                    user = loadtest.FakeUser(loadtest.USER_ID_BASE, 'user0')
+                    client = main.create_client(loop, loadtest.FakeClient)
+                    client.add_user(user)
+                    course_db_ids = seed_watched_courses(
+                        main.db, [(term, crn) for crn in crns], user.id)
+                    main.load_watched_courses()
+                    elapsed = loop.run_until_complete(watcher_loop(
+                        course_db_ids, args.iterations))
+                    for course_db_id in course_db_ids:
+                        debounce.forget(course_db_id)
+                finally:
+                    reset_logging(listener)
+                    loadtest.shutdown(loop)
+            print(constants.BENCHMARK_MSG_RUNTIME.format(
+                mode, ', '.join(enabled) or 'standard library',
+                elapsed * 1000, elapsed * 1e6 / args.courses))
+            if missing:
+                print(constants.BENCHMARK_MSG_MISSING.format(
+                    mode, ', '.join(missing)))
+    finally:
+        runtime.select('default')
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description=constants.BENCHMARK_DESCRIPTION)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    logging_parser = subparsers.add_parser(
+        'logging', help=constants.ARG_HELP_BENCHMARK_LOGGING)
+    logging_parser.add_argument('--courses', type=int, default=1000,
+                                help=constants.ARG_HELP_BENCHMARK_COURSES)
+    logging_parser.add_argument('--iterations', type=int, default=10,
+                                help=constants.ARG_HELP_BENCHMARK_ITERATIONS)
+    logging_parser.set_defaults(func=benchmark_logging)
+    runtime_parser = subparsers.add_parser(
+        'runtime', help=constants.ARG_HELP_BENCHMARK_RUNTIME)
+    runtime_parser.add_argument('--courses', type=int, default=1000,
+                                help=constants.ARG_HELP_BENCHMARK_COURSES)
+    runtime_parser.add_argument('--iterations', type=int, default=10,
+                                help=constants.ARG_HELP_BENCHMARK_ITERATIONS)
+    runtime_parser.set_defaults(func=benchmark_runtime)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,126 @@
+import asyncio
+import re
+import sqlite3
+from . import logutil, constants, banner, http, scheduler
+
+logger = logutil.get_logger(__name__)
+search_available = False
+
+
+def search_init(db):
+    global search_available
+    try:
+        next(db.execute(constants.SQL_CHECK_TABLE_EXISTS,
+                        ('catalog_search',)))
+    except StopIteration:
+        rebuild = True
+    else:
+        rebuild = False
+    try:
+        db.executescript(constants.SQL_INITIALIZE_SEARCH)
+    except sqlite3.OperationalError:
+        logger.warning(constants.LOG_MSG_SEARCH_UNAVAILABLE)
+        return
+    if rebuild:
+        with db:
+            db.execute(constants.SQL_REBUILD_SEARCH)
+    search_available = True
+
+
+def search(db, school_id, term, query, page=1,
+           page_size=constants.SEARCH_PAGE_SIZE):
+    tokens = re.findall(r'\w+', query.lower())
+    if not tokens:
+        return 0, []
+    match = ' '.join('"{0!s}"*'.format(token) for token in tokens)
+    total, = next(db.execute(constants.SQL_SEARCH_CATALOG_COUNT,
+                             (match, school_id, term)))
+    results = db.execute(constants.SQL_SEARCH_CATALOG, (
+        match, school_id, term, page_size, (page - 1) * page_size)).fetchall()
+    return total, results
+
+
+def store_listing(db, school_id, term, sections):
+    with db:
+        db.executemany(constants.SQL_UPSERT_CATALOG_LISTING, (
+            (school_id, term, section.crn, section.name, section.id,
+             section.section) for section in sections))
+
+
+def store_seats(db, school_id, term, class_info):
+    db.execute(constants.SQL_UPSERT_CATALOG_SEATS, (
+        school_id, term, class_info.crn, class_info.name, class_info.id,
+        class_info.section, class_info.seat_cap, class_info.seat_act,
+        class_info.seat_rem, class_info.wait_cap, class_info.wait_act,
+        class_info.wait_rem))
+
+
+def lookup(db, school_id, term, crn):
+    try:
+        return next(db.execute(constants.SQL_GET_CATALOG_SEATS,
+                               (school_id, term, crn)))
+    except StopIteration:
+        return None
+
+
+async def harvest_listing(db, school_id, base_url, term, subjects_per_request,
+                          session=None):
+    subjects = await banner.get_subjects(base_url, term, session=session,
+                                         priority=scheduler.BACKGROUND)
+    count = 0
+    for i in range(0, len(subjects), subjects_per_request):
+        sections = await banner.get_section_listing(
+            base_url, term, subjects[i:i + subjects_per_request],
+            session=session, priority=scheduler.BACKGROUND)
+        store_listing(db, school_id, term, sections)
+        count += len(sections)
+    logger.info(constants.LOG_MSG_CATALOG_HARVESTED, count, school_id, term)
+
+
+async def refresh_seats(db, school_id, base_url, term, max_age, batch_size,
+                        session=None):
+    crns = [crn for crn, in db.execute(constants.SQL_GET_CATALOG_STALE_CRNS,
+                                       (school_id, term, max_age,
+                                        batch_size))]
+    if not crns:
+        return
+    results = await asyncio.gather(*(
+        banner.get_class_info(base_url, crn, term=term, session=session,
+                              priority=scheduler.BACKGROUND)
+        for crn in crns), return_exceptions=True)
+    with db:
+        for class_info in results:
+            if isinstance(class_info, banner.ClassInfo):
+                store_seats(db, school_id, term, class_info)
+    logger.debug(constants.LOG_MSG_CATALOG_SEATS_REFRESHED, len(crns),
+                 school_id, term)
+
+
+async def refresh_school(db, school_id, base_url, term, config,
+                         session=None):
+    listing_age, = next(db.execute(constants.SQL_GET_CATALOG_LISTING_AGE,
+                                   (school_id, term)))
+    if listing_age is None or listing_age > int(
+            config.catalog_listing_max_age):
+        await harvest_listing(db, school_id, base_url, term,
+                              int(config.catalog_subjects_per_request),
+                              session=session)
+    await refresh_seats(db, school_id, base_url, term,
+                        int(config.catalog_seat_data_max_age),
+                        int(config.catalog_refresh_batch_size),
+                        session=session)
+
+
+async def harvester(db, config):
+    while True:
+        term = banner.get_default_term()
+        async with http.create_aiohttp_session() as session:
+            for school_id, base_url in db.execute(
+                    constants.SQL_GET_ACTIVE_SCHOOLS).fetchall():
+                try:
+                    await refresh_school(db, school_id, base_url, term,
+                                         config, session=session)
+                except Exception:
+                    logger.exception('failed to refresh catalog for school '
+                                     'ID {0!s}, term {1!s}', school_id, term)
+        await asyncio.sleep(float(config.catalog_refresh_interval))
@@ -0,0 +1,33 @@
+import os
+import time
+from . import logutil, constants, runtime
+
+logger = logutil.get_logger(__name__)
+
+STATE_VERSION = 1
+
+
+def save(path, state):
+    state = dict(state, version=STATE_VERSION, saved_at=time.time())
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(runtime.dumps(state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load(path):
+    try:
+        with open(path) as f:
+            state = runtime.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(constants.LOG_MSG_STATE_UNREADABLE, path, e)
+        return None
+    if state.get('version') != STATE_VERSION:
+        logger.warning(constants.LOG_MSG_STATE_UNREADABLE, path,
+                       'unsupported version')
+        return None
+    return state
@@ -0,0 +1,183 @@
+import asyncio
+import math
+import os
+import socket
+import sqlite3
+import time
+from . import logutil, constants
+
+logger = logutil.get_logger(__name__)
+
+ROLES = ('all', 'notifier', 'poller')
+
+role = 'all'
+worker_id = None
+partitions = 1
+lease_ttl = None
+owned_partitions = frozenset()
+
+
+def init(db, new_role, new_worker_id, partition_count, new_lease_ttl):
+    global role
+    global worker_id
+    global partitions
+    global lease_ttl
+    global owned_partitions
+    if new_role not in ROLES:
+        raise ValueError('invalid role: {0!s}'.format(new_role))
+    role = new_role
+    worker_id = new_worker_id or '{0!s}-{1!s}'.format(socket.gethostname(),
+                                                      os.getpid())
+    lease_ttl = new_lease_ttl
+    if role == 'all':
+        partitions = 1
+        owned_partitions = frozenset((0,))
+        return
+    partitions = partition_count
+    owned_partitions = frozenset()
+    db.execute('PRAGMA journal_mode = WAL')
+    db.executescript(constants.SQL_INITIALIZE_CLUSTER)
+    add_missing_columns(db, 'notification_queue',
+                        constants.SQL_NOTIFICATION_QUEUE_COLUMNS)
+    if role == 'notifier':
+        claim_notifier_lock(db)
+
+
+def add_missing_columns(db, table, columns):
+    # CREATE TABLE IF NOT EXISTS leaves tables from older versions as they
+    # were
+    existing = {name for _, name, _, _, _, _ in db.execute(
+        constants.SQL_GET_TABLE_COLUMNS.format(table))}
+    with db:
+        for name, declared_type in columns:
+            if name not in existing:
+                db.execute(constants.SQL_ADD_COLUMN.format(
+                    table, name, declared_type))
+
+
+def is_clustered():
+    return role != 'all'
+
+
+def has_discord():
+    return role != 'poller'
+
+
+def get_partition(course_db_id):
+    return course_db_id % partitions
+
+
+def owns(course_db_id):
+    return get_partition(course_db_id) in owned_partitions
+
+
+def rebalance(db):
+    global owned_partitions
+    now = time.time()
+    expires = now + lease_ttl
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute(constants.SQL_HEARTBEAT_WORKER, (worker_id, now))
+        db.execute(constants.SQL_DELETE_DEAD_WORKERS, (now - lease_ttl,))
+        db.execute(constants.SQL_DELETE_EXPIRED_LEASES, (now,))
+        db.execute(constants.SQL_RENEW_LEASES, (expires, worker_id))
+        live_workers, = next(db.execute(constants.SQL_COUNT_WORKERS))
+        share = math.ceil(partitions / max(live_workers, 1))
+        leases = {partition: owner for partition, owner in db.execute(
+            constants.SQL_GET_LEASES)}
+        mine = sorted(p for p, owner in leases.items() if owner == worker_id)
+        if len(mine) > share:
+            db.executemany(constants.SQL_RELEASE_LEASE, (
+                (p, worker_id) for p in mine[share:]))
+            mine = mine[:share]
+        elif len(mine) < share:
+            free = [p for p in range(partitions) if p not in leases]
+            claimed = free[:share - len(mine)]
+            db.executemany(constants.SQL_CLAIM_LEASE, (
+                (p, worker_id, expires) for p in claimed))
+            mine.extend(claimed)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    new_partitions = frozenset(mine)
+    if new_partitions != owned_partitions:
+        logger.info(constants.LOG_MSG_CLUSTER_REBALANCED, worker_id,
+                    len(new_partitions), partitions, live_workers)
+    owned_partitions = new_partitions
+
+
+def claim_notifier_lock(db):
+    # the notifier takes no part in partitioning; it only holds a lock that
+    # keeps a second notifier from delivering the same notifications
+    now = time.time()
+    expires = now + lease_ttl
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute(constants.SQL_DELETE_EXPIRED_NOTIFIER_LOCK, (now,))
+        db.execute(constants.SQL_CLAIM_NOTIFIER_LOCK, (worker_id, expires))
+        db.execute(constants.SQL_RENEW_NOTIFIER_LOCK, (expires, worker_id))
+        owner, = next(db.execute(constants.SQL_GET_NOTIFIER_LOCK))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    if owner != worker_id:
+        raise RuntimeError('notifier {0!s} is already running'.format(owner))
+
+
+def renew(db):
+    if role == 'notifier':
+        claim_notifier_lock(db)
+    else:
+        rebalance(db)
+
+
+def leave(db):
+    global owned_partitions
+    if not is_clustered():
+        return
+    with db:
+        if role == 'notifier':
+            db.execute(constants.SQL_RELEASE_NOTIFIER_LOCK, (worker_id,))
+        else:
+            db.execute(constants.SQL_RELEASE_ALL_LEASES, (worker_id,))
+            db.execute(constants.SQL_DELETE_WORKER, (worker_id,))
+    owned_partitions = frozenset()
+
+
+async def heartbeat(db, interval):
+    while True:
+        try:
+            renew(db)
+        except sqlite3.OperationalError as e:
+            # another instance holds the write lock; retry soon instead of a
+            # whole interval later so that the leases do not expire
+            logger.warning(constants.LOG_MSG_CLUSTER_DB_BUSY, e)
+            await asyncio.sleep(min(interval,
+                                    constants.WORKER_RENEW_RETRY_INTERVAL))
+            continue
+        except Exception:
+            logger.exception('failed to renew leases')
+        await asyncio.sleep(interval)
+
+
+def get_watchlist_version(db):
+    version, = next(db.execute(constants.SQL_GET_WATCHLIST_VERSION))
+    return version
+
+
+def enqueue_notification(db, course_db_id, previous, trace_id, created):
+    # runs in the caller's transaction
+    previous_seat_rem, previous_wait_rem = previous
+    db.execute(constants.SQL_ENQUEUE_NOTIFICATION,
+               (course_db_id, previous_seat_rem, previous_wait_rem, trace_id,
+                created))
+
+
+def dequeue_notifications(db):
+    with db:
+        rows = db.execute(constants.SQL_GET_QUEUED_NOTIFICATIONS).fetchall()
+        db.executemany(constants.SQL_DELETE_QUEUED_NOTIFICATION,
+                       ((row[0],) for row in rows))
+    return [row[1:] for row in rows]
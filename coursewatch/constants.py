@@ -18,18 +18,155 @@ def command(regex):
 
 
 DESCRIPTION = 'Discord bot to watch availability of courses on Ellucian Banner'
+BENCHMARK_DESCRIPTION = 'Benchmark parts of CourseWatch'
+EXPORT_DESCRIPTION = unwrap('''
+    Export a snapshot of CourseWatch course and watchlist data to a compact
+    columnar file
+    ''')
+LOADTEST_DESCRIPTION = unwrap('''
+    Measure conversation throughput of CourseWatch with simulated Discord
+    users
+    ''')
+
+CONFIG_BOOLEANS = {
+    True: True,
+    False: False,
+    'true': True,
+    'false': False,
+    'yes': True,
+    'no': False,
+    'on': True,
+    'off': False,
+    '1': True,
+    '0': False,
+}
 
 CONFIG_DEFAULTS = {
     'color': 'auto',
     'log_level': '',
     'db_file': 'coursewatch.db',
     'seat_data_max_age': 30,
+    'log_json': False,
+    'log_queue': False,
+    'user_cache_size': 4096,
+    'user_cache_ttl': 6 * 60 * 60,
+    'user_cache_prewarm_concurrency': 16,
+    'google_cse_base_url': 'https://www.googleapis.com/customsearch/v1',
+    'autodiscovery_positive_ttl': 7 * 24 * 60 * 60,
+    'autodiscovery_negative_ttl': 60 * 60,
+    'autodiscovery_cache_size': 1024,
+    'banner_probe_timeout': 5,
+    'banner_probe_concurrency': 32,
+    'google_cse_timeout': 10,
+    'catalog_listing_max_age': 24 * 60 * 60,
+    'catalog_seat_data_max_age': 60 * 60,
+    'catalog_refresh_interval': 5 * 60,
+    'catalog_refresh_batch_size': 20,
+    'catalog_subjects_per_request': 10,
+    'http_mode': 'live',
+    'http_archive': 'coursewatch-http.archive',
+    'http_replay_speed': 1.0,
+    'maintenance_interval': 6 * 60 * 60,
+    'maintenance_slice_size': 500,
+    'course_cache_max_age': 24 * 60 * 60,
+    'diagnostics_dir': 'diagnostics',
+    'diagnostics_duration': 30,
+    'diagnostics_top': 50,
+    'diagnostics_trace_memory': False,
+    'slow_step_threshold': 0.1,
+    'lag_probe_interval': 0.1,
+    'metrics_report_interval': 5 * 60,
+    'runtime': 'default',
+    'banner_request_policy': {},
+    'banner_host_request_policies': {},
+    'fetch_workers': 32,
+    'fetch_reserved_workers': 8,
+    'fetch_interactive_queue_size': 100,
+    'fetch_background_queue_size': 10000,
+    'trace_file': None,
+    'trace_file_max_bytes': 10 * 1024 * 1024,
+    'trace_file_backup_count': 5,
+    'role': 'all',
+    'worker_id': None,
+    'partitions': 64,
+    'worker_lease_ttl': 30,
+    'db_busy_timeout': 0.5,
+    'worker_heartbeat_interval': 10,
+    'notification_queue_poll_interval': 1,
+    'notification_mode': 'any',
+    'notification_min_change': 1,
+    'notification_settle_window': 0,
+    'notification_user_interval': 0,
+    'watcher_tick_interval': 1,
+    'state_file': 'coursewatch-state-{worker_id}.json',
 }
 
 ARG_HELP_CONFIG_FILE = 'YAML file in which tokens are stored'
 ARG_HELP_COLOR = 'whether log output should be in color (no/auto/always)'
 ARG_HELP_LOG_LEVEL = 'minimum logging level'
 ARG_HELP_DB_FILE = 'database file (default: coursewatch.db)'
+ARG_HELP_LOG_JSON = 'write log output as one JSON object per line'
+ARG_HELP_LOG_QUEUE = 'write log output from a background thread'
+ARG_HELP_RUNTIME = unwrap('''
+    use uvloop, lxml, and orjson where installed (fast) or only the
+    standard library (default)
+    ''')
+ARG_HELP_ROLE = unwrap('''
+    all: a single instance that does everything; notifier: the one
+    Discord-facing instance of a group sharing the database; poller: an
+    instance of such a group that only polls Banner (default: all)
+    ''')
+ARG_HELP_WORKER_ID = unwrap('''
+    name of this instance in a group sharing the database (default:
+    hostname and process ID)
+    ''')
+ARG_HELP_HTTP_MODE = unwrap('''
+    whether HTTP requests go to live servers, are recorded to the HTTP
+    archive, or are replayed from it (live/record/replay)
+    ''')
+ARG_HELP_HTTP_ARCHIVE = unwrap('''
+    file in which recorded HTTP traffic is stored (default:
+    coursewatch-http.archive)
+    ''')
+ARG_HELP_BENCHMARK_LOGGING = unwrap('''
+    time the watcher loop at each log level with plain, JSON, and queued
+    log output
+    ''')
+ARG_HELP_BENCHMARK_COURSES = unwrap('''
+    number of watched test courses refreshed per iteration (default: 1000)
+    ''')
+ARG_HELP_BENCHMARK_RUNTIME = unwrap('''
+    time the watcher loop over replayed Banner pages with the default and
+    the fast runtime
+    ''')
+ARG_HELP_BENCHMARK_ITERATIONS = 'number of iterations to time (default: 10)'
+ARG_HELP_EXPORT_OUTPUT = 'file to write the export to'
+ARG_HELP_EXPORT_CHUNK_SIZE = unwrap('''
+    number of rows per compressed chunk (default: 65536)
+    ''')
+ARG_HELP_LOADTEST_USERS = 'number of simulated users (default: 1000)'
+ARG_HELP_LOADTEST_ROUNDS = unwrap('''
+    number of watch/list/unwatch rounds per user (default: 3)
+    ''')
+ARG_HELP_LOADTEST_CONCURRENCY = unwrap('''
+    maximum number of users sending messages at once (default: 1000)
+    ''')
+ARG_HELP_LOADTEST_THINK_TIME = unwrap('''
+    maximum random delay in seconds between a user's messages (default:
+    0.05)
+    ''')
+ARG_HELP_LOADTEST_TIMEOUT = unwrap('''
+    seconds to wait for a reply before counting a timeout (default: 30)
+    ''')
+ARG_HELP_LOADTEST_SCHOOL = unwrap('''
+    school website all users sign up with (default: example.edu)
+    ''')
+ARG_HELP_LOADTEST_BANNER_URL = unwrap('''
+    Banner base URL stored for the school so no autodiscovery happens
+    ''')
+ARG_HELP_LOADTEST_DB_FILE = unwrap('''
+    database file to use (default: a temporary file)
+    ''')
 
 LOG_FORMAT = '[{asctime!s}] {name!s}: {message!s}'
 LOG_FORMAT_COLORED = (colored('[{asctime!s}]', 'green') + ' '
@@ -40,6 +177,12 @@ LOG_MSG_READY = 'Ready! Logged in as: {0!s} (ID: {1!s})'
 LOG_MSG_BANNER_URL_AUTODISCOVER_SUCCESS = unwrap('''
     Successfully autodiscovered Banner base URL for {0!s}: {1!s}
     ''')
+LOG_MSG_BANNER_URL_PROBE_SUCCESS = unwrap('''
+    Found Banner for {0!s} by probing common locations: {1!s}
+    ''')
+LOG_MSG_CSE_TIMEOUT = unwrap('''
+    Google Custom Search timed out while autodiscovering Banner for {0!s}
+    ''')
 LOG_MSG_BANNER_URL_MANUAL_SUCCESS = unwrap('''
     Successfully entered manual Banner base URL for {0!s}: {1!s}
     ''')
@@ -50,6 +193,125 @@ LOG_MSG_WATCHER_LOOP_DISPATCH = unwrap('''
 LOG_MSG_WATCHER_LOOP_ITERATION_END = unwrap('''
     Watcher loop has finished executing tasks
     ''')
+LOG_MSG_USER_CACHE_PREWARM = unwrap('''
+    Prewarming Discord DM channels for {0!s} uncached users
+    ''')
+LOG_MSG_CATALOG_HARVESTED = unwrap('''
+    Harvested {0!s} sections for school ID {1!s}, term {2!s} into the
+    catalog
+    ''')
+LOG_MSG_CATALOG_SEATS_REFRESHED = unwrap('''
+    Refreshed catalog seat data for {0!s} sections of school ID {1!s},
+    term {2!s}
+    ''')
+LOG_MSG_SEARCH_UNAVAILABLE = unwrap('''
+    SQLite was built without FTS5, so the find command is disabled
+    ''')
+LOG_MSG_HTTP_REPLAY_MISS = unwrap('''
+    No recorded response for {0!s} {1!s}; replaying HTTP 404
+    ''')
+LOG_MSG_MAINTENANCE_DONE = unwrap('''
+    Database maintenance expired {0!s} watchlist entries for ended terms,
+    pruned {1!s} unwatched courses and {2!s} catalog entries, and
+    reclaimed {3!s} bytes
+    ''')
+LOG_MSG_MAINTENANCE_AUTO_VACUUM = unwrap('''
+    Converting database to incremental auto-vacuum; this happens once
+    and may take a while on a large database
+    ''')
+LOG_MSG_MAINTENANCE_AUTO_VACUUM_DONE = unwrap('''
+    Converted database to incremental auto-vacuum in {0:.1f} seconds; this
+    will not be needed again
+    ''')
+LOG_MSG_DIAGNOSTICS_STARTED = unwrap('''
+    Received SIGUSR1; dumped pending tasks and profiling for {0!s}
+    seconds into {1!s}
+    ''')
+LOG_MSG_DIAGNOSTICS_WRITTEN = 'Wrote profile and memory snapshot into {0!s}'
+DIAGNOSTICS_MEMORY_HEADER_HEAP = unwrap('''
+    # Largest allocations still alive, made since memory tracing started
+    ''')
+DIAGNOSTICS_MEMORY_HEADER_WINDOW = unwrap('''
+    # Largest allocations still alive, made during the profiling window only
+    (set diagnostics_trace_memory to see the whole heap)
+    ''')
+LOG_MSG_DIAGNOSTICS_BUSY = unwrap('''
+    Received SIGUSR1, but diagnostics are already being collected
+    ''')
+LOG_MSG_SLOW_STEP = unwrap('''
+    Slow step blocked the event loop: {0!s} ran for {1:.3f} seconds
+    ''')
+LOG_MSG_LOOP_LAG = 'Event loop was {0:.3f} seconds late'
+LOG_MSG_METRICS_HISTOGRAM = 'Metric {0!s}: {1!s}'
+LOG_MSG_METRICS_COUNTER = 'Metric {0!s}: {1!s}'
+LOG_MSG_RUNTIME_ENABLED = 'Fast runtime is using: {0!s}'
+LOG_MSG_RUNTIME_MISSING = unwrap('''
+    Fast runtime requested, but these packages are not installed and
+    standard library fallbacks are in use instead: {0!s}
+    ''')
+LOG_MSG_BANNER_RETRY = unwrap('''
+    Request to {0!s} failed ({1!r}); retrying in {2:.2f} seconds
+    (retry {3!s} of {4!s})
+    ''')
+LOG_MSG_NOTIFICATION_REVERTED = unwrap('''
+    Dropped pending notification for course with ID {0!s} because its
+    availability reverted within the settle window
+    ''')
+BENCHMARK_MSG_HEADER = 'Benchmarking {0!s} ({1:d} items, {2:d} iterations)'
+BENCHMARK_MSG_WATCHER = unwrap('''
+    {0!s:>8} {1!s:>10}: {2:9.2f} ms per iteration, {3:8.2f} us per course
+    ''')
+BENCHMARK_MSG_RUNTIME = unwrap('''
+    {0!s:>8} ({1!s}): {2:9.2f} ms per iteration, {3:8.2f} us per course
+    ''')
+BENCHMARK_MSG_MISSING = '{0!s:>8} (not installed: {1!s})'
+BENCHMARK_DETAIL_PAGE = unwrap('''
+    <html><body><table class="datadisplaytable" summary="This table is
+    used to present the detailed class information."><tr><th
+    class="ddlabel" scope="row">Intro to Object Orient Prog - {crn:05d} - CS
+    1331 - A<br><br></th></tr><tr><td class="dddefault"><span
+    class="fieldlabeltext">Associated Term: </span>Fall 2020<br><span
+    class="fieldlabeltext">Registration Dates: </span>Apr 06, 2020 to Aug
+    28, 2020<br>3.000 Credits<br><table class="datadisplaytable"
+    summary="This layout table is used to present the seating
+    numbers."><tr><th class="ddheader" scope="col"><span
+    class="fieldlabeltext">Select</span></th><th class="ddheader"
+    scope="col"><span class="fieldlabeltext">Capacity</span></th><th
+    class="ddheader" scope="col"><span
+    class="fieldlabeltext">Actual</span></th><th class="ddheader"
+    scope="col"><span class="fieldlabeltext">Remaining</span></th></tr><tr><th
+    class="ddlabel" scope="row"><span
+    class="fieldlabeltext">Seats</span></th><td
+    class="dddefault">60</td><td class="dddefault">{seat_act:d}</td><td
+    class="dddefault">{seat_rem:d}</td></tr><tr><th class="ddlabel"
+    scope="row"><span class="fieldlabeltext">Waitlist Seats</span></th><td
+    class="dddefault">10</td><td class="dddefault">0</td><td
+    class="dddefault">10</td></tr></table></td></tr></table></body></html>
+    ''')
+LOG_MSG_EXPORT_TABLE = 'Exported {1!s} rows from table {0!s}'
+LOG_MSG_LOADTEST_THROUGHPUT = unwrap('''
+    Handled {0:d} messages in {1:.2f} seconds ({2:.1f} messages/second)
+    ''')
+LOG_MSG_LOADTEST_MEMORY = unwrap('''
+    {0:d} active conversations using {1:.0f} bytes each
+    ''')
+LOG_MSG_LOADTEST_LATENCY = 'Reply latency for {0!s}: {1!s}'
+LOG_MSG_STATE_SAVED = unwrap('''
+    Saved state to {0!s} ({1!s} scheduled courses, {2!s} pending
+    notifications)
+    ''')
+LOG_MSG_STATE_RESTORED = unwrap('''
+    Restored state from {0!s} ({1!s} scheduled courses, {2!s} pending
+    notifications, saved {3:.0f} seconds ago)
+    ''')
+LOG_MSG_STATE_UNREADABLE = 'Ignoring unreadable state file {0!s}: {1!s}'
+LOG_MSG_CLUSTER_DB_BUSY = unwrap('''
+    Database busy ({0!s}); will retry
+    ''')
+LOG_MSG_CLUSTER_REBALANCED = unwrap('''
+    Worker {0!s} now polls {1!s} of {2!s} partitions ({3!s} live
+    workers)
+    ''')
 
 USER_MSG_DISCLAIMER = unwrap('''
     Rishov Sarkar, creator of the CourseWatch bot, is not liable for any
@@ -151,6 +413,29 @@ USER_MSG_WATCHLIST_ENTRY = unwrap('''
     **{id!s} {section!s}** *{name!s}* (CRN {crn!s:0>5}, {human_term!s}):
     **{seat_rem!s} of {seat_cap!s} {seat_or_waitlist_cap!s} available**
     ''')
+USER_MSG_SEARCH_RESULTS = unwrap('''
+    Here are results {0!s}\u2013{1!s} of {2!s} for `{3!s}` ({4!s}):
+    ''')
+USER_MSG_SEARCH_ENTRY = unwrap('''
+    **{id!s} {section!s}** *{name!s}* (CRN {crn!s:0>5}):
+    **{seat_rem!s} of {seat_cap!s} {seat_or_waitlist_cap!s} available**
+    ''')
+USER_MSG_SEARCH_ENTRY_NO_SEATS = unwrap('''
+    **{id!s} {section!s}** *{name!s}* (CRN {crn!s:0>5})
+    ''')
+USER_MSG_SEARCH_MORE = unwrap('''
+    Type `find {0!s} page {1!s}` to see more results.
+    ''')
+USER_MSG_SEARCH_NO_RESULTS = unwrap('''
+    Sorry, I couldn't find any classes matching `{0!s}` for {1!s}. If
+    your school was only just set up, I may still be gathering its
+    course listing; try again in a few minutes, or look the class up by
+    its CRN.
+    ''')
+USER_MSG_SEARCH_UNAVAILABLE = unwrap('''
+    Sorry, searching for classes isn't available right now. You can
+    still look up a class by its CRN.
+    ''')
 USER_MSG_INVALID_SCHOOL_WEBSITE = unwrap('''
     Hmmm, that doesn't seem like a valid website. I'm looking for
     something like `http://www.gatech.edu/` or like `uga.edu`.
@@ -233,6 +518,9 @@ USER_MSG_HELP = unwrap('''
     `remove <CRN>`, `delete <CRN>`, `drop <CRN>`, `unwatch <CRN>`, or
     `stop watching <CRN>` will remove the course from your watchlist.\n
     `list` or `watchlist` will display your current watchlist.\n
+    `find <subject, number, or title>` will search for courses at your
+    school, such as `find CS 1331` or `find linear algebra`. Add `page
+    <number>` to see more results.\n
     `disclaimer` will display the disclaimer message.\n
     `help` will display this help message.
 
@@ -265,6 +553,9 @@ USER_MSG_NOTIFICATION_DESCRIPTION = unwrap('''
     now has **{seat_rem!s} available {seat_or_waitlist_rem!s}** out of a
     total of {seat_cap!s} {seat_or_waitlist_cap!s}.
     ''')
+USER_MSG_BUSY = unwrap('''
+    Sorry, I'm very busy right now. Please try again in a minute.
+    ''')
 USER_MSG_CRASH = unwrap('''
     Sorry! Your session crashed unexpectedly. If you just entered a
     command, it may not have been processed correctly. Please try again
@@ -312,6 +603,32 @@ SQL_INITIALIZE = '''
         FOREIGN KEY(user_id) REFERENCES users(id),
         FOREIGN KEY(course_id) REFERENCES courses(id)
     );
+    CREATE TABLE IF NOT EXISTS catalog (
+        id INTEGER PRIMARY KEY,
+        school_id INTEGER NOT NULL,
+        term INTEGER NOT NULL,
+        crn INTEGER NOT NULL,
+        name TEXT,
+        course_id TEXT,
+        section TEXT,
+        seat_cap INTEGER,
+        seat_act INTEGER,
+        seat_rem INTEGER,
+        wait_cap INTEGER,
+        wait_act INTEGER,
+        wait_rem INTEGER,
+        seats_last_updated INTEGER,
+        listing_last_updated INTEGER DEFAULT (strftime('%s', 'now')),
+        UNIQUE(school_id, term, crn),
+        FOREIGN KEY(school_id) REFERENCES schools(id)
+    );
+    CREATE INDEX IF NOT EXISTS courses_by_class_info
+        ON courses (school_id, term, crn);
+    CREATE INDEX IF NOT EXISTS catalog_by_seats_last_updated
+        ON catalog (school_id, term, seats_last_updated);
+    CREATE INDEX IF NOT EXISTS watchlist_by_course
+        ON watchlist (course_id);
+    CREATE INDEX IF NOT EXISTS watchlist_by_user ON watchlist (user_id);
     '''
 SQL_ADD_USER = 'INSERT INTO users (discord_id, state) VALUES (?, ?)'
 SQL_RESET_USER_WATCHLIST = 'DELETE FROM watchlist WHERE user_id = ?'
@@ -359,12 +676,221 @@ SQL_REMOVE_FROM_WATCHLIST = '''DELETE FROM watchlist WHERE id = ?'''
 SQL_GET_USERS_TO_NOTIFY = '''SELECT discord_id FROM watchlist LEFT JOIN
                              users ON user_id = users.id
                              WHERE course_id = ?'''
-SQL_GET_WATCHED_COURSES = '''SELECT DISTINCT course_id FROM watchlist'''
+SQL_COUNT_WATCHED_COURSES = '''SELECT course_id, COUNT(*) FROM watchlist
+                               GROUP BY course_id'''
+SQL_GET_USER_WATCHED_COURSES = '''SELECT course_id FROM watchlist
+                                  WHERE user_id = ?'''
 SQL_GET_USER_WATCHLIST = '''SELECT term, crn, name, courses.course_id AS
                             course_id, section, seat_cap, seat_rem, wait_cap,
                             wait_rem FROM watchlist INNER JOIN courses ON
                             watchlist.course_id = courses.id WHERE
                             user_id = ?'''
+SQL_CREATE_CLASS_WITH_AGE = '''INSERT INTO courses (school_id, term, crn,
+                               name, course_id, section, seat_cap, seat_act,
+                               seat_rem, wait_cap, wait_act, wait_rem,
+                               seats_last_updated)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                               strftime('%s', 'now') - ?)'''
+SQL_UPSERT_CATALOG_LISTING = '''INSERT INTO catalog (school_id, term, crn,
+                                name, course_id, section)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (school_id, term, crn) DO UPDATE
+                                SET name = excluded.name,
+                                course_id = excluded.course_id,
+                                section = excluded.section,
+                                listing_last_updated = strftime('%s', 'now')'''
+SQL_UPSERT_CATALOG_SEATS = '''INSERT INTO catalog (school_id, term, crn, name,
+                              course_id, section, seat_cap, seat_act,
+                              seat_rem, wait_cap, wait_act, wait_rem,
+                              seats_last_updated)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                              strftime('%s', 'now'))
+                              ON CONFLICT (school_id, term, crn) DO UPDATE
+                              SET name = excluded.name,
+                              course_id = excluded.course_id,
+                              section = excluded.section,
+                              seat_cap = excluded.seat_cap,
+                              seat_act = excluded.seat_act,
+                              seat_rem = excluded.seat_rem,
+                              wait_cap = excluded.wait_cap,
+                              wait_act = excluded.wait_act,
+                              wait_rem = excluded.wait_rem,
+                              seats_last_updated = strftime('%s', 'now')'''
+SQL_GET_CATALOG_SEATS = '''SELECT name, course_id, section, seat_cap,
+                           seat_act, seat_rem, wait_cap, wait_act, wait_rem,
+                           (strftime('%s', 'now') - seats_last_updated) AS
+                           seats_updated_seconds_ago FROM catalog
+                           WHERE school_id = ? AND term = ? AND crn = ?
+                           AND seats_last_updated IS NOT NULL'''
+SQL_GET_CATALOG_STALE_CRNS = '''SELECT crn FROM catalog WHERE school_id = ?
+                                AND term = ? AND (seats_last_updated IS NULL
+                                OR seats_last_updated
+                                < strftime('%s', 'now') - ?)
+                                ORDER BY seats_last_updated LIMIT ?'''
+SQL_GET_CATALOG_LISTING_AGE = '''SELECT (strftime('%s', 'now')
+                                 - MAX(listing_last_updated)) FROM catalog
+                                 WHERE school_id = ? AND term = ?'''
+SQL_GET_ACTIVE_SCHOOLS = '''SELECT DISTINCT schools.id, banner_base_url
+                            FROM schools INNER JOIN users
+                            ON users.school_id = schools.id
+                            WHERE banner_base_url IS NOT NULL'''
+SQL_INITIALIZE_SEARCH = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5 (
+        course_id,
+        name,
+        content='catalog',
+        content_rowid='id'
+    );
+    CREATE TRIGGER IF NOT EXISTS catalog_search_insert AFTER INSERT ON catalog
+    BEGIN
+        INSERT INTO catalog_search (rowid, course_id, name)
+        VALUES (new.id, new.course_id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_search_delete AFTER DELETE ON catalog
+    BEGIN
+        INSERT INTO catalog_search (catalog_search, rowid, course_id, name)
+        VALUES ('delete', old.id, old.course_id, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_search_update
+    AFTER UPDATE OF course_id, name ON catalog
+    WHEN old.course_id IS NOT new.course_id OR old.name IS NOT new.name
+    BEGIN
+        INSERT INTO catalog_search (catalog_search, rowid, course_id, name)
+        VALUES ('delete', old.id, old.course_id, old.name);
+        INSERT INTO catalog_search (rowid, course_id, name)
+        VALUES (new.id, new.course_id, new.name);
+    END;
+    '''
+SQL_CHECK_TABLE_EXISTS = 'SELECT 1 FROM sqlite_master WHERE name = ?'
+SQL_GET_TABLE_COLUMNS = 'PRAGMA table_info({0!s})'
+SQL_EXPORT_TABLE = 'SELECT {1!s} FROM {0!s} ORDER BY rowid'
+SQL_REBUILD_SEARCH = '''INSERT INTO catalog_search (catalog_search)
+                        VALUES ('rebuild')'''
+SQL_SEARCH_CATALOG_COUNT = '''SELECT COUNT(*) FROM catalog_search
+                              INNER JOIN catalog
+                              ON catalog.id = catalog_search.rowid
+                              WHERE catalog_search MATCH ?
+                              AND school_id = ? AND term = ?'''
+SQL_SEARCH_CATALOG = '''SELECT term, crn, catalog.name AS name,
+                        catalog.course_id AS course_id, section, seat_cap,
+                        seat_rem, wait_cap, wait_rem FROM catalog_search
+                        INNER JOIN catalog ON catalog.id = catalog_search.rowid
+                        WHERE catalog_search MATCH ?
+                        AND school_id = ? AND term = ?
+                        ORDER BY bm25(catalog_search, 10.0, 1.0),
+                        catalog.course_id, section LIMIT ? OFFSET ?'''
+SQL_INITIALIZE_HTTP_ARCHIVE = '''
+    CREATE TABLE IF NOT EXISTS exchanges (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL,
+        method TEXT NOT NULL,
+        url TEXT NOT NULL,
+        body TEXT,
+        status INTEGER NOT NULL,
+        headers TEXT,
+        content BLOB,
+        elapsed REAL,
+        recorded_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS exchanges_by_key ON exchanges (key, id);
+    '''
+SQL_RECORD_HTTP_EXCHANGE = '''INSERT INTO exchanges (key, method, url, body,
+                              status, headers, content, elapsed, recorded_at)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+SQL_GET_HTTP_EXCHANGE_IDS = '''SELECT id FROM exchanges WHERE key = ?
+                               ORDER BY id'''
+SQL_GET_HTTP_EXCHANGE = '''SELECT status, headers, content, elapsed
+                           FROM exchanges WHERE id = ?'''
+SQL_GET_KNOWN_TERMS = '''SELECT term FROM courses UNION
+                         SELECT term FROM catalog'''
+SQL_EXPIRE_WATCHLIST_SLICE = '''DELETE FROM watchlist WHERE id IN (
+                                SELECT watchlist.id FROM watchlist
+                                INNER JOIN courses
+                                ON watchlist.course_id = courses.id
+                                WHERE courses.term = ? LIMIT ?)'''
+SQL_EXPIRE_CATALOG_SLICE = '''DELETE FROM catalog WHERE id IN (
+                              SELECT id FROM catalog WHERE term = ?
+                              LIMIT ?)'''
+SQL_PRUNE_COURSES_SLICE = '''DELETE FROM courses WHERE id IN (
+                             SELECT id FROM courses WHERE NOT EXISTS (
+                             SELECT 1 FROM watchlist
+                             WHERE watchlist.course_id = courses.id)
+                             AND seats_last_updated
+                             < strftime('%s', 'now') - ? LIMIT ?)'''
+SQL_INITIALIZE_CLUSTER = '''
+    CREATE TABLE IF NOT EXISTS workers (
+        id TEXT PRIMARY KEY,
+        heartbeat REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS leases (
+        partition INTEGER PRIMARY KEY,
+        worker_id TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS notifier_lock (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        worker_id TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS notification_queue (
+        id INTEGER PRIMARY KEY,
+        course_id INTEGER NOT NULL,
+        previous_seat_rem INTEGER,
+        previous_wait_rem INTEGER,
+        trace_id TEXT,
+        created REAL,
+        FOREIGN KEY(course_id) REFERENCES courses(id)
+    );
+    CREATE TABLE IF NOT EXISTS watchlist_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO watchlist_version (id, version) VALUES (0, 0);
+    CREATE TRIGGER IF NOT EXISTS watchlist_version_insert
+    AFTER INSERT ON watchlist BEGIN
+        UPDATE watchlist_version SET version = version + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS watchlist_version_delete
+    AFTER DELETE ON watchlist BEGIN
+        UPDATE watchlist_version SET version = version + 1;
+    END;
+    '''
+SQL_NOTIFICATION_QUEUE_COLUMNS = (
+    ('previous_seat_rem', 'INTEGER'),
+    ('previous_wait_rem', 'INTEGER'),
+    ('trace_id', 'TEXT'),
+    ('created', 'REAL'),
+)
+SQL_ADD_COLUMN = 'ALTER TABLE {0!s} ADD COLUMN {1!s} {2!s}'
+SQL_GET_WATCHLIST_VERSION = 'SELECT version FROM watchlist_version'
+SQL_HEARTBEAT_WORKER = '''INSERT INTO workers (id, heartbeat) VALUES (?, ?)
+                          ON CONFLICT (id) DO UPDATE
+                          SET heartbeat = excluded.heartbeat'''
+SQL_DELETE_DEAD_WORKERS = 'DELETE FROM workers WHERE heartbeat < ?'
+SQL_DELETE_WORKER = 'DELETE FROM workers WHERE id = ?'
+SQL_COUNT_WORKERS = 'SELECT COUNT(*) FROM workers'
+SQL_DELETE_EXPIRED_LEASES = 'DELETE FROM leases WHERE expires < ?'
+SQL_RENEW_LEASES = 'UPDATE leases SET expires = ? WHERE worker_id = ?'
+SQL_GET_LEASES = 'SELECT partition, worker_id FROM leases'
+SQL_CLAIM_LEASE = '''INSERT INTO leases (partition, worker_id, expires)
+                     VALUES (?, ?, ?)'''
+SQL_RELEASE_LEASE = 'DELETE FROM leases WHERE partition = ? AND worker_id = ?'
+SQL_RELEASE_ALL_LEASES = 'DELETE FROM leases WHERE worker_id = ?'
+SQL_DELETE_EXPIRED_NOTIFIER_LOCK = '''DELETE FROM notifier_lock
+                                      WHERE expires < ?'''
+SQL_CLAIM_NOTIFIER_LOCK = '''INSERT OR IGNORE INTO notifier_lock (id,
+                             worker_id, expires) VALUES (0, ?, ?)'''
+SQL_RENEW_NOTIFIER_LOCK = '''UPDATE notifier_lock SET expires = ?
+                             WHERE worker_id = ?'''
+SQL_GET_NOTIFIER_LOCK = 'SELECT worker_id FROM notifier_lock'
+SQL_RELEASE_NOTIFIER_LOCK = 'DELETE FROM notifier_lock WHERE worker_id = ?'
+SQL_ENQUEUE_NOTIFICATION = '''INSERT INTO notification_queue (course_id,
+                              previous_seat_rem, previous_wait_rem, trace_id,
+                              created) VALUES (?, ?, ?, ?, ?)'''
+SQL_GET_QUEUED_NOTIFICATIONS = '''SELECT id, course_id, previous_seat_rem,
+                                  previous_wait_rem, trace_id, created
+                                  FROM notification_queue ORDER BY id'''
+SQL_DELETE_QUEUED_NOTIFICATION = 'DELETE FROM notification_queue WHERE id = ?'
 
 REGEX_CLASS = (
     r'(?:(fall|autumn|spring|summer)(?: |/)(\d{4,})(?: |/)|'
@@ -380,6 +906,7 @@ CMD_CLASS_START_WATCHING = command(
 CMD_CLASS_STOP_WATCHING = command(
     r'(?:remove|drop|delete|unwatch|stop watch(?:ing)?) {0!s}'
     .format(REGEX_CLASS))
+CMD_SEARCH = command(r'(?:find|search) (.+?)(?: page (\d+))?')
 CMD_WATCHLIST = command(r'(?:my )?(?:watches|watch\s*list|list)')
 CMD_HELP = command(r'(?:help|\?)')
 CMD_DISCLAIMER = command(r'disclaimer')
@@ -396,10 +923,22 @@ BANNER_TERMS_BY_NUMBER = {
     5: 'summer',
     8: 'fall'
 }
+BANNER_TERM_END_MONTHS = {
+    2: 5,
+    5: 8,
+    8: 12,
+}
 
 MSG_PARAM_WAITLIST_SPOT = 'waitlist spot'
 MSG_PARAM_SEAT = 'seat'
 
+SEARCH_PAGE_SIZE = 10
+NOTIFICATION_HISTORY_SIZE = 65536
+EXPORT_TABLES = ('courses', 'watchlist', 'seat_history')
+EXPORT_CHUNK_SIZE = 65536
+EXPORT_COMPRESSION_LEVEL = 6
+EXPORT_BACKUP_PAGES = 1024
+
 TEST_CLASS_CRN = 0
 TEST_CLASS_NAME = 'Test Class (changes every minute)'
 TEST_CLASS_COURSE_ID = 'TEST 0000'
@@ -407,3 +946,46 @@ TEST_CLASS_SECTION = '0'
 
 BANNER_TEST_PATH = 'bwckschd.p_disp_dyn_sched'
 BANNER_DETAILS_PATH = 'bwckschd.p_disp_detail_sched'
+BANNER_REQUEST_POLICY_DEFAULTS = {
+    'connect_timeout': 5,
+    'read_timeout': 10,
+    'total_timeout': 30,
+    'retries': 2,
+    'backoff_base': 0.5,
+    'backoff_max': 5,
+    'hedge_quantile': 0.95,
+    'hedge_min_samples': 20,
+}
+WORKER_RENEW_RETRY_INTERVAL = 1
+BANNER_REQUEST_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+BANNER_DEFAULT_ENCODING = 'utf-8'
+BANNER_STREAM_CHUNK_SIZE = 4096
+BANNER_ENCODING_SNIFF_SIZE = 16384
+BANNER_TERM_DATE_PATH = 'bwckgens.p_proc_term_date'
+BANNER_SECTION_LISTING_PATH = 'bwckschd.p_get_crse_unsec'
+BANNER_SECTION_LISTING_DUMMY_FIELDS = tuple(
+    (field, 'dummy') for field in (
+        'sel_subj', 'sel_day', 'sel_schd', 'sel_insm', 'sel_camp',
+        'sel_levl', 'sel_sess', 'sel_instr', 'sel_ptrm', 'sel_attr',
+    ))
+BANNER_SECTION_LISTING_FIELDS = (
+    ('sel_crse', ''), ('sel_title', ''), ('sel_schd', '%'),
+    ('sel_from_cred', ''), ('sel_to_cred', ''), ('sel_camp', '%'),
+    ('sel_levl', '%'), ('sel_ptrm', '%'), ('sel_instr', '%'),
+    ('sel_attr', '%'), ('begin_hh', '0'), ('begin_mi', '0'),
+    ('begin_ap', 'a'), ('end_hh', '0'), ('end_mi', '0'), ('end_ap', 'a'),
+)
+BANNER_PROBE_MARKER = 'bwckgens.p_proc_term_date'
+# 8 hosts x 4 paths, so that the default banner_probe_concurrency probes
+# every candidate in a single round
+BANNER_PROBE_HOST_PREFIXES = (
+    'oscar', 'banner', 'ssb', 'selfservice', 'banweb', 'bannerweb',
+    'registration', '',
+)
+BANNER_PROBE_PATHS = ('/pls/prod/', '/pls/PROD/', '/prod/', '/')
+
+HTTP_ARCHIVE_REDACTED_PARAMS = ('key',)
+HTTP_ARCHIVE_HEADERS = ('Content-Type', 'Content-Encoding', 'Location')
+
+METRICS_BYTE_BOUNDS = (1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072,
+                       262144, 524288, 1048576)
@@ -0,0 +1,239 @@
+import asyncio
+import time
+from . import logutil, constants, cache, metrics, tracing
+
+logger = logutil.get_logger(__name__)
+
+MODES = ('any', 'opening')
+
+mode = 'any'
+min_change = 1
+settle_window = 0
+user_interval = 0
+
+_dispatch = None
+_send = None
+_baselines = {}
+_settling = {}
+_deferred = {}
+_last_sent = cache.LRUCache(constants.NOTIFICATION_HISTORY_SIZE)
+
+
+def init(dispatch, send, new_mode, new_min_change, new_settle_window,
+         new_user_interval):
+    global mode
+    global min_change
+    global settle_window
+    global user_interval
+    global _dispatch
+    global _send
+    global _last_sent
+    if new_mode not in MODES:
+        raise ValueError('invalid notification mode: {0!s}'.format(new_mode))
+    mode = new_mode
+    min_change = new_min_change
+    settle_window = new_settle_window
+    user_interval = new_user_interval
+    _dispatch = dispatch
+    _send = send
+    _last_sent = cache.LRUCache(constants.NOTIFICATION_HISTORY_SIZE)
+
+
+def get_seat_state(seat_rem, wait_rem):
+    if seat_rem > 0:
+        return seat_rem, None
+    return seat_rem, wait_rem
+
+
+def get_class_state(class_info):
+    return get_seat_state(class_info.seat_rem, class_info.wait_rem)
+
+
+def is_closed(state):
+    seat_rem, wait_rem = state
+    return seat_rem <= 0 and (wait_rem is None or wait_rem <= 0)
+
+
+def is_opening(old, new):
+    old_seat_rem, old_wait_rem = old
+    new_seat_rem, new_wait_rem = new
+    if old_seat_rem <= 0 < new_seat_rem:
+        return True
+    return (new_wait_rem is not None and new_wait_rem > 0
+            and (old_wait_rem is None or old_wait_rem <= 0)
+            and old_seat_rem <= 0)
+
+
+def is_significant(old, new):
+    if old == new:
+        return False
+    if is_opening(old, new):
+        return True
+    if mode == 'opening':
+        return False
+    old_seat_rem, old_wait_rem = old
+    new_seat_rem, new_wait_rem = new
+    if (old_seat_rem > 0) != (new_seat_rem > 0):
+        return True
+    if old_seat_rem != new_seat_rem:
+        return abs(new_seat_rem - old_seat_rem) >= min_change
+    return abs((new_wait_rem or 0) - (old_wait_rem or 0)) >= min_change
+
+
+def submit(class_info, previous, trace):
+    course_db_id = class_info.db_id
+    baseline = _baselines.setdefault(course_db_id,
+                                     get_seat_state(*previous))
+    state = get_class_state(class_info)
+    pending = _settling.get(course_db_id)
+    if pending is not None:
+        if state == baseline:
+            pending[2].cancel()
+            del _settling[course_db_id]
+            metrics.increment('notifications.reverted')
+            logger.debug(constants.LOG_MSG_NOTIFICATION_REVERTED,
+                         course_db_id)
+            return
+        pending[0] = class_info
+        return
+    if not settle_window:
+        settle(course_db_id, class_info, trace)
+        return
+    handle = asyncio.get_event_loop().call_later(
+        settle_window, settled, course_db_id)
+    _settling[course_db_id] = [class_info, trace, handle]
+
+
+def settled(course_db_id):
+    class_info, trace, _ = _settling.pop(course_db_id)
+    settle(course_db_id, class_info, trace)
+
+
+def settle(course_db_id, class_info, trace):
+    state = get_class_state(class_info)
+    if not is_significant(_baselines[course_db_id], state):
+        metrics.increment('notifications.suppressed')
+        # in opening mode only the transition matters, so always compare
+        # against the latest state; otherwise keep accumulating small
+        # changes, but not across a closing, so that reopening is reported
+        if mode == 'opening' or is_closed(state):
+            _baselines[course_db_id] = state
+        return
+    _baselines[course_db_id] = state
+    _dispatch(class_info, trace)
+
+
+def forget(course_db_id):
+    _baselines.pop(course_db_id, None)
+    pending = _settling.pop(course_db_id, None)
+    if pending is not None:
+        pending[2].cancel()
+
+
+def reserve(user_id, when):
+    # remembers each user's latest sent or scheduled message until the
+    # interval after it has passed
+    if when > _last_sent.get(user_id, when - 1):
+        _last_sent.set(user_id, when,
+                       ttl=when + user_interval - time.monotonic())
+
+
+def deliver(user_id, course_db_id, summary, description, trace):
+    key = user_id, course_db_id
+    pending = _deferred.get(key)
+    if pending is not None:
+        pending[:3] = summary, description, trace
+        metrics.increment('notifications.coalesced')
+        return
+    try:
+        sent = _last_sent[user_id]
+    except KeyError:
+        send(key, summary, description, trace)
+        return
+    due = sent + user_interval
+    reserve(user_id, due)
+    handle = asyncio.get_event_loop().call_later(
+        due - time.monotonic(), flush, key)
+    _deferred[key] = [summary, description, trace, handle]
+    metrics.increment('notifications.deferred')
+
+
+def flush(key):
+    summary, description, trace, _ = _deferred.pop(key)
+    send(key, summary, description, trace)
+
+
+def send(key, summary, description, trace):
+    user_id, _ = key
+    if user_interval:
+        reserve(user_id, time.monotonic())
+    _send(user_id, summary, description, trace)
+
+
+def resume_trace(trace_id, start, course_db_id):
+    trace = tracing.Trace(trace_id, start, course_db_id=course_db_id)
+    trace.commit()
+    return trace
+
+
+def get_remaining(handle):
+    return max(handle.when() - asyncio.get_event_loop().time(), 0)
+
+
+def get_state():
+    now = time.time()
+    return {
+        'baselines': [[course_db_id, list(state)]
+                      for course_db_id, state in _baselines.items()],
+        'settling': [{
+            'course_db_id': course_db_id,
+            'trace_id': trace.trace_id,
+            'start': trace.start,
+            'due': now + get_remaining(handle),
+        } for course_db_id, (_, trace, handle) in _settling.items()],
+        'deferred': [{
+            'user_id': user_id,
+            'course_db_id': course_db_id,
+            'summary': summary,
+            'description': description,
+            'trace_id': trace.trace_id,
+            'start': trace.start,
+            'due': now + get_remaining(handle),
+        } for (user_id, course_db_id), (summary, description, trace, handle)
+            in _deferred.items()],
+    }
+
+
+def restore_state(state, get_class_info, restore_pending=True):
+    loop = asyncio.get_event_loop()
+    now = time.time()
+    for course_db_id, seat_state in state.get('baselines', []):
+        _baselines[course_db_id] = tuple(seat_state)
+    if not restore_pending:
+        return
+    for entry in state.get('settling', []):
+        course_db_id = entry['course_db_id']
+        class_info = get_class_info(course_db_id)
+        if class_info is None or course_db_id in _settling:
+            continue
+        trace = resume_trace(entry['trace_id'], entry['start'],
+                             course_db_id)
+        handle = loop.call_later(max(entry['due'] - now, 0), settled,
+                                 course_db_id)
+        _settling[course_db_id] = [class_info, trace, handle]
+    for entry in state.get('deferred', []):
+        key = entry['user_id'], entry['course_db_id']
+        if key in _deferred:
+            continue
+        trace = resume_trace(entry['trace_id'], entry['start'],
+                             entry['course_db_id'])
+        delay = max(entry['due'] - now, 0)
+        if user_interval:
+            reserve(entry['user_id'], time.monotonic() + delay)
+        handle = loop.call_later(delay, flush, key)
+        _deferred[key] = [entry['summary'], entry['description'], trace,
+                          handle]
+
+
+def get_pending_count():
+    return len(_settling) + len(_deferred)
@@ -0,0 +1,102 @@
+import asyncio
+import cProfile
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+from . import logutil, constants
+
+logger = logutil.get_logger(__name__)
+
+_output_dir = None
+_duration = None
+_top = None
+_active = False
+
+
+def install(loop, output_dir, duration, top, trace_memory=False):
+    global _output_dir
+    global _duration
+    global _top
+    _output_dir = output_dir
+    _duration = duration
+    _top = top
+    if trace_memory:
+        # tracemalloc only sees allocations made after it starts, so the
+        # whole heap is only visible if it runs from startup
+        tracemalloc.start()
+    try:
+        loop.add_signal_handler(signal.SIGUSR1, trigger, loop)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        return False
+    return True
+
+
+def get_output_path(stamp, suffix):
+    return os.path.join(_output_dir, 'coursewatch-{0!s}-{1!s}'.format(
+        stamp, suffix))
+
+
+def dump_tasks(loop, path):
+    with open(path, 'w') as f:
+        for task in asyncio.all_tasks(loop):
+            print(repr(task), file=f)
+            task.print_stack(file=f)
+            print(file=f)
+
+
+def dump_profile(profiler, path):
+    profiler.dump_stats(path + '.prof')
+    with open(path + '.txt', 'w') as f:
+        stats = pstats.Stats(profiler, stream=f)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(_top)
+
+
+def dump_memory(path, since_startup):
+    snapshot = tracemalloc.take_snapshot()
+    with open(path, 'w') as f:
+        if since_startup:
+            print(constants.DIAGNOSTICS_MEMORY_HEADER_HEAP, file=f)
+        else:
+            print(constants.DIAGNOSTICS_MEMORY_HEADER_WINDOW, file=f)
+        for stat in snapshot.statistics('lineno')[:_top]:
+            print(stat, file=f)
+
+
+def trigger(loop):
+    global _active
+    if _active:
+        logger.warning(constants.LOG_MSG_DIAGNOSTICS_BUSY)
+        return
+    _active = True
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    try:
+        os.makedirs(_output_dir, exist_ok=True)
+        dump_tasks(loop, get_output_path(stamp, 'tasks.txt'))
+    except Exception:
+        logger.exception('failed to dump asyncio tasks')
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    logger.info(constants.LOG_MSG_DIAGNOSTICS_STARTED, _duration, _output_dir)
+    loop.call_later(_duration, finish, profiler, stamp, started_tracemalloc)
+
+
+def finish(profiler, stamp, started_tracemalloc):
+    global _active
+    profiler.disable()
+    try:
+        dump_profile(profiler, get_output_path(stamp, 'profile'))
+        dump_memory(get_output_path(stamp, 'memory.txt'),
+                    not started_tracemalloc)
+    except Exception:
+        logger.exception('failed to write diagnostics')
+    else:
+        logger.info(constants.LOG_MSG_DIAGNOSTICS_WRITTEN, _output_dir)
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _active = False
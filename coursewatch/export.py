@@ -0,0 +1,236 @@
+import argparse
+import logging
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from pathlib import Path
+from . import logutil, constants
+
+logger = logutil.get_logger(__name__)
+
+MAGIC = b'CWEXPORT'
+FORMAT_VERSION = 2
+# version 1 files have no per-chunk column types
+READABLE_FORMAT_VERSIONS = (1, 2)
+
+TYPE_INTEGER = b'i'
+TYPE_REAL = b'f'
+TYPE_TEXT = b's'
+ARRAY_TYPECODES = {TYPE_INTEGER: 'q', TYPE_REAL: 'd'}
+
+
+def get_column_type(declared_type):
+    # follows SQLite's column affinity rules
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return TYPE_INTEGER
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return TYPE_REAL
+    return TYPE_TEXT
+
+
+def get_chunk_type(column_type, values):
+    # SQLite only gives columns an affinity, so an INTEGER column can still
+    # hold a REAL value like 1.5, or any column some text
+    value_types = {type(value) for value in values if value is not None}
+    if column_type == TYPE_INTEGER and value_types <= {int}:
+        return TYPE_INTEGER
+    if column_type != TYPE_TEXT and value_types <= {int, float}:
+        return TYPE_REAL
+    return TYPE_TEXT
+
+
+def snapshot(db_file, snapshot_file, pages):
+    source = sqlite3.connect(Path(db_file).resolve().as_uri() + '?mode=ro',
+                             uri=True)
+    try:
+        target = sqlite3.connect(snapshot_file)
+        try:
+            # copying a few pages per step keeps the bot's writes from being
+            # blocked for the whole copy
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(values, data):
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def pack_string(value):
+    value = value.encode()
+    return struct.pack('<H', len(value)) + value
+
+
+def encode_column(column_type, values):
+    nulls = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is None:
+            nulls[i // 8] |= 1 << (i % 8)
+    if column_type == TYPE_TEXT:
+        encoded = [b'' if value is None else str(value).encode()
+                   for value in values]
+        lengths = array('q', map(len, encoded))
+        return bytes(nulls) + little_endian(lengths) + b''.join(encoded)
+    default = 0 if column_type == TYPE_INTEGER else 0.0
+    data = array(ARRAY_TYPECODES[column_type],
+                 (default if value is None else value for value in values))
+    return bytes(nulls) + little_endian(data)
+
+
+def encode_chunk(column_types, rows, compression_level):
+    chunk = [struct.pack('<I', len(rows))]
+    for column_type, values in zip(column_types, zip(*rows)):
+        chunk_type = get_chunk_type(column_type, values)
+        chunk.append(chunk_type + encode_column(chunk_type, values))
+    return zlib.compress(b''.join(chunk), compression_level)
+
+
+def export_table(db, out, table, chunk_size, compression_level):
+    columns = [(name, get_column_type(declared_type)) for _, name,
+               declared_type, _, _, _ in db.execute(
+                   constants.SQL_GET_TABLE_COLUMNS.format(table))]
+    out.write(pack_string(table))
+    out.write(struct.pack('<H', len(columns)))
+    for name, column_type in columns:
+        out.write(pack_string(name) + column_type)
+    cur = db.execute(constants.SQL_EXPORT_TABLE.format(
+        table, ', '.join('"{0!s}"'.format(name) for name, _ in columns)))
+    column_types = [column_type for _, column_type in columns]
+    row_count = 0
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = encode_chunk(column_types, rows, compression_level)
+        out.write(struct.pack('<I', len(chunk)))
+        out.write(chunk)
+        row_count += len(rows)
+    out.write(struct.pack('<I', 0))
+    return row_count
+
+
+def export(db_file, output_file, tables=constants.EXPORT_TABLES,
+           chunk_size=constants.EXPORT_CHUNK_SIZE,
+           compression_level=constants.EXPORT_COMPRESSION_LEVEL,
+           backup_pages=constants.EXPORT_BACKUP_PAGES):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_file = os.path.join(temp_dir, 'snapshot.db')
+        snapshot(db_file, snapshot_file, backup_pages)
+        db = sqlite3.connect(snapshot_file)
+        try:
+            with open(output_file, 'wb') as out:
+                out.write(MAGIC + struct.pack('<H', FORMAT_VERSION))
+                for table in tables:
+                    try:
+                        next(db.execute(constants.SQL_CHECK_TABLE_EXISTS,
+                                        (table,)))
+                    except StopIteration:
+                        continue
+                    row_count = export_table(db, out, table, chunk_size,
+                                             compression_level)
+                    logger.info(constants.LOG_MSG_EXPORT_TABLE, table,
+                                row_count)
+                out.write(struct.pack('<H', 0))
+        finally:
+            db.close()
+
+
+def read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('truncated export file')
+    return data
+
+
+def unpack_string(f):
+    length, = struct.unpack('<H', read_exact(f, 2))
+    return read_exact(f, length).decode()
+
+
+def decode_column(column_type, data, offset, row_count):
+    nulls = data[offset:offset + (row_count + 7) // 8]
+    offset += len(nulls)
+    if column_type == TYPE_TEXT:
+        lengths = from_little_endian(
+            array('q'), data[offset:offset + row_count * 8])
+        offset += row_count * 8
+        values = []
+        for length in lengths:
+            values.append(data[offset:offset + length].decode())
+            offset += length
+    else:
+        values = array(ARRAY_TYPECODES[column_type])
+        size = row_count * values.itemsize
+        values = from_little_endian(
+            values, data[offset:offset + size]).tolist()
+        offset += size
+    for i in range(row_count):
+        if nulls[i // 8] & (1 << (i % 8)):
+            values[i] = None
+    return values, offset
+
+
+def read(input_file):
+    with open(input_file, 'rb') as f:
+        header = read_exact(f, len(MAGIC) + 2)
+        version, = struct.unpack('<H', header[len(MAGIC):])
+        if (header[:len(MAGIC)] != MAGIC
+                or version not in READABLE_FORMAT_VERSIONS):
+            raise ValueError('not a CourseWatch export file')
+        while True:
+            table = unpack_string(f)
+            if not table:
+                return
+            column_count, = struct.unpack('<H', read_exact(f, 2))
+            columns = []
+            for _ in range(column_count):
+                columns.append((unpack_string(f), read_exact(f, 1)))
+            while True:
+                size, = struct.unpack('<I', read_exact(f, 4))
+                if not size:
+                    break
+                data = zlib.decompress(read_exact(f, size))
+                row_count, = struct.unpack('<I', data[:4])
+                offset = 4
+                chunk = {}
+                for name, column_type in columns:
+                    if version >= 2:
+                        column_type = data[offset:offset + 1]
+                        offset += 1
+                    chunk[name], offset = decode_column(
+                        column_type, data, offset, row_count)
+                yield table, chunk
+
+
+def run():
+    parser = argparse.ArgumentParser(description=constants.EXPORT_DESCRIPTION)
+    parser.add_argument('output_file', help=constants.ARG_HELP_EXPORT_OUTPUT)
+    parser.add_argument('--db-file', default='coursewatch.db',
+                        help=constants.ARG_HELP_DB_FILE)
+    parser.add_argument('--chunk-size', type=int,
+                        default=constants.EXPORT_CHUNK_SIZE,
+                        help=constants.ARG_HELP_EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    logutil.configure(constants.LOG_FORMAT, level=logging.INFO,
+                      style=constants.LOG_FORMAT_STYLE)
+    export(args.db_file, args.output_file, chunk_size=args.chunk_size)
+
+
+if __name__ == '__main__':
+    run()
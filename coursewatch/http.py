@@ -1,11 +1,59 @@
 import aiohttp
 import ssl
+from . import replay
 
 CIPHERS = '{defaults}:!DH'.format(defaults=ssl._DEFAULT_CIPHERS)
 
+_shared_session = None
+_mode = 'live'
+_archive = None
+_replay_speed = 1.0
 
-def create_aiohttp_session():
+
+def init(mode, archive_file=None, replay_speed=1.0):
+    global _mode
+    global _archive
+    global _replay_speed
+    if mode not in ('live', 'record', 'replay'):
+        raise ValueError('invalid HTTP mode: {0!s}'.format(mode))
+    _mode = mode
+    _replay_speed = replay_speed
+    if mode != 'live':
+        _archive = replay.Archive(archive_file)
+
+
+def close_archive():
+    global _archive
+    if _archive is not None:
+        _archive.close()
+        _archive = None
+
+
+def create_live_aiohttp_session():
     ssl_context = ssl.create_default_context()
     ssl_context.set_ciphers(CIPHERS)
     return aiohttp.ClientSession(
         connector=aiohttp.TCPConnector(ssl=ssl_context))
+
+
+def create_aiohttp_session():
+    if _mode == 'replay':
+        return replay.ReplaySession(_archive, _replay_speed)
+    session = create_live_aiohttp_session()
+    if _mode == 'record':
+        return replay.RecordingSession(session, _archive)
+    return session
+
+
+def get_shared_session():
+    global _shared_session
+    if _shared_session is None or _shared_session.closed:
+        _shared_session = create_aiohttp_session()
+    return _shared_session
+
+
+async def close_shared_session():
+    global _shared_session
+    if _shared_session is not None:
+        await _shared_session.close()
+        _shared_session = None
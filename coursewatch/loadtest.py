@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import discord
+from . import logutil, constants, main, metrics
+
+logger = logutil.get_logger(__name__)
+
+USER_ID_BASE = 10 ** 17
+
+
+class FakeUser:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.mention = '<@{0!s}>'.format(id)
+        self.dm_channel = None
+        self.bot_user = None
+
+    async def create_dm(self):
+        if self.dm_channel is None:
+            self.dm_channel = FakeChannel(self, self.bot_user)
+        return self.dm_channel
+
+    def mentioned_in(self, message):
+        return self.mention in message.content
+
+
+class FakeMessage:
+    def __init__(self, content, author, channel):
+        self.content = content
+        self.author = author
+        self.channel = channel
+
+    async def edit(self, content):
+        self.content = content
+        metrics.increment('loadtest.edits')
+
+
+class FakeChannel:
+    type = discord.ChannelType.private
+
+    def __init__(self, recipient, bot_user):
+        self.recipient = recipient
+        self.bot_user = bot_user
+        self.waiter = None
+
+    async def send(self, content):
+        message = FakeMessage(content, self.bot_user, self)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(message)
+        else:
+            metrics.increment('loadtest.notifications')
+        return message
+
+
+class FakeClient:
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.user = FakeUser(0, 'CourseWatch')
+        self.users = {}
+        self.handlers = {}
+        self.waiters = []
+
+    def event(self, coro):
+        self.handlers[coro.__name__] = coro
+        return coro
+
+    def add_user(self, user):
+        user.bot_user = self.user
+        self.users[user.id] = user
+
+    async def fetch_user(self, user_id):
+        return self.users[user_id]
+
+    def wait_for(self, event, check=None):
+        future = self.loop.create_future()
+        self.waiters.append((event, check, future))
+        return future
+
+    def dispatch(self, event, *args):
+        # like discord.Client, resolve matching waiters and also run the
+        # event handler
+        waiters = []
+        for waiter in self.waiters:
+            name, check, future = waiter
+            if future.cancelled():
+                continue
+            if name == event and (check is None or check(*args)):
+                future.set_result(args[0] if len(args) == 1 else args)
+            else:
+                waiters.append(waiter)
+        self.waiters = waiters
+        handler = self.handlers.get('on_' + event)
+        if handler is not None:
+            asyncio.ensure_future(handler(*args), loop=self.loop)
+
+    async def start(self, token):
+        self.dispatch('ready')
+
+    async def close(self):
+        for _, _, future in self.waiters:
+            future.cancel()
+        self.waiters = []
+
+
+async def say(client, user, content, command, timeout):
+    channel = user.dm_channel
+    channel.waiter = client.loop.create_future()
+    start = time.perf_counter()
+    client.dispatch('message', FakeMessage(content, user, channel))
+    try:
+        await asyncio.wait_for(channel.waiter, timeout)
+    except asyncio.TimeoutError:
+        metrics.increment('loadtest.timeouts.' + command)
+    else:
+        metrics.histogram('loadtest.' + command).observe(
+            time.perf_counter() - start)
+    finally:
+        channel.waiter = None
+    metrics.increment('loadtest.messages')
+
+
+async def think(think_time):
+    await asyncio.sleep(random.uniform(0, think_time))
+
+
+async def onboard(client, user, school_name, think_time, timeout):
+    await say(client, user, 'hello', 'onboarding', timeout)
+    await think(think_time)
+    await say(client, user, school_name, 'school', timeout)
+
+
+async def browse(client, user, rounds, think_time, timeout):
+    crn = '{0:05d}'.format(constants.TEST_CLASS_CRN)
+    for _ in range(rounds):
+        await think(think_time)
+        await say(client, user, 'watch ' + crn, 'watch', timeout)
+        await think(think_time)
+        await say(client, user, 'list', 'list', timeout)
+        await think(think_time)
+        await say(client, user, 'unwatch ' + crn, 'unwatch', timeout)
+
+
+async def bounded(semaphore, coro):
+    async with semaphore:
+        await coro
+
+
+def seed_school(db, school_name, banner_url):
+    with db:
+        db.execute(constants.SQL_ADD_SCHOOL_OR_IGNORE, (school_name,))
+        school_id, _, _ = next(db.execute(constants.SQL_GET_SCHOOL_ID_URL,
+                                          (school_name,)))
+        db.execute(constants.SQL_SET_SCHOOL_URL, (banner_url, school_id))
+
+
+async def run_load(client, args):
+    fake_users = []
+    for i in range(args.users):
+        user = FakeUser(USER_ID_BASE + i, 'user{0:d}'.format(i))
+        client.add_user(user)
+        await user.create_dm()
+        fake_users.append(user)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tracemalloc.start()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(semaphore, onboard(
+        client, user, args.school, args.think_time, args.timeout))
+        for user in fake_users))
+    memory_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    active = len(main.conversations)
+    await asyncio.gather(*(bounded(semaphore, browse(
+        client, user, args.rounds, args.think_time, args.timeout))
+        for user in fake_users))
+    elapsed = time.perf_counter() - start
+    messages = metrics.get_counter('loadtest.messages')
+    logger.info(constants.LOG_MSG_LOADTEST_THROUGHPUT, messages, elapsed,
+                messages / elapsed)
+    logger.info(constants.LOG_MSG_LOADTEST_MEMORY, active,
+                (memory_after - memory_before) / max(active, 1))
+    for command in ('onboarding', 'school', 'watch', 'list', 'unwatch'):
+        logger.info(constants.LOG_MSG_LOADTEST_LATENCY, command,
+                    metrics.histogram('loadtest.' + command).summary())
+    metrics.report()
+
+
+def configure(db_file, **options):
+    overrides = {
+        'db_file': db_file,
+        'state_file': '',
+        'discord_api_token': '',
+        'google_api_token': '',
+        'google_cse_id': '',
+    }
+    overrides.update(options)
+    main.config = main.ConfigReader(
+        overrides.__getitem__, main.environ_getter,
+        constants.CONFIG_DEFAULTS.__getitem__)
+
+
+def shutdown(loop):
+    if main.client is not None:
+        loop.run_until_complete(main.client.close())
+    pending = asyncio.all_tasks(loop=loop)
+    # return_exceptions retrieves every task's exception, so none are logged
+    # as never retrieved
+    gathered = asyncio.gather(*pending, return_exceptions=True)
+    gathered.cancel()
+    try:
+        loop.run_until_complete(gathered)
+    except asyncio.CancelledError:
+        pass
+    loop.close()
+    if main.db is not None:
+        main.db.close()
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description=constants.LOADTEST_DESCRIPTION)
+    parser.add_argument('--users', type=int, default=1000,
+                        help=constants.ARG_HELP_LOADTEST_USERS)
+    parser.add_argument('--rounds', type=int, default=3,
+                        help=constants.ARG_HELP_LOADTEST_ROUNDS)
+    parser.add_argument('--concurrency', type=int, default=1000,
+                        help=constants.ARG_HELP_LOADTEST_CONCURRENCY)
+    parser.add_argument('--think-time', type=float, default=0.05,
+                        help=constants.ARG_HELP_LOADTEST_THINK_TIME)
+    parser.add_argument('--timeout', type=float, default=30,
+                        help=constants.ARG_HELP_LOADTEST_TIMEOUT)
+    parser.add_argument('--school', default='example.edu',
+                        help=constants.ARG_HELP_LOADTEST_SCHOOL)
+    parser.add_argument('--banner-url',
+                        default='https://banner.example.edu/pls/PROD/',
+                        help=constants.ARG_HELP_LOADTEST_BANNER_URL)
+    parser.add_argument('--db-file', help=constants.ARG_HELP_LOADTEST_DB_FILE)
+    args = parser.parse_args()
+    logutil.configure(constants.LOG_FORMAT, level=logging.INFO,
+                      style=constants.LOG_FORMAT_STYLE)
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        configure(args.db_file or os.path.join(temp_dir, 'loadtest.db'))
+        try:
+            main.initialize()
+            seed_school(main.db, args.school, args.banner_url)
+            client = main.create_client(loop, FakeClient)
+            loop.run_until_complete(client.start(None))
+            asyncio.ensure_future(main.watcher(), loop=loop)
+            loop.run_until_complete(run_load(client, args))
+        finally:
+            shutdown(loop)
+
+
+if __name__ == '__main__':
+    run()
@@ -1,4 +1,19 @@
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+
+
+class BraceMessage:
+    __slots__ = ('fmt', 'args')
+
+    def __init__(self, fmt, args):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        return self.fmt.format(*self.args)
 
 
 class StyleAdapter(logging.LoggerAdapter):
@@ -6,7 +21,63 @@ class StyleAdapter(logging.LoggerAdapter):
         super().__init__(logger, extra or {})
 
     def log(self, level, msg, *args, **kwargs):
-        return super().log(level, msg.format(*args), **kwargs)
+        if self.isEnabledFor(level):
+            super().log(level, BraceMessage(msg, args), **kwargs)
+
+
+class JSONFormatter(logging.Formatter):
+    def __init__(self, dumps=json.dumps):
+        super().__init__()
+        self.dumps = dumps
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'name': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return self.dumps(entry)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # unlike the base class, keep the traceback separate from the message
+        # so that the formatter on the listener side can still place it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure(format, level=None, style='%', use_json=False,
+              use_queue=False, json_dumps=json.dumps, stream=None):
+    handler = logging.StreamHandler(stream)
+    if use_json:
+        handler.setFormatter(JSONFormatter(json_dumps))
+    else:
+        handler.setFormatter(logging.Formatter(format, style=style))
+    root = logging.getLogger()
+    if level is not None:
+        root.setLevel(level)
+    if not use_queue:
+        root.addHandler(handler)
+        return None
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter())
+    root.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, handler,
+                                              respect_handler_level=True)
+    listener.start()
+    return listener
 
 
 def get_logger(name):
@@ -14,16 +14,29 @@ import yaml
 import functools
 import humanize
 import concurrent
-from . import logutil, constants, banner, http
+import heapq
+import math
+import random
+import time
+from . import logutil, constants, banner, http, cache, catalog, maintenance, \
+    diagnostics, metrics, monitor, runtime, policy, scheduler, tracing, \
+    cluster, debounce, checkpoint
 from urllib.parse import urlparse, urljoin
-from collections import namedtuple, deque
+from collections import namedtuple, deque, Counter
 
-client = discord.Client()
+client = None
 config = None
 db = None
 logger = logutil.get_logger(__name__)
 conversations = set()
-users = {}
+refreshing = set()
+watched_courses = Counter()
+watched_courses_version = None
+next_due = {}
+due_queue = []
+users = None
+dm_channels = None
+state_file = None
 
 ClassInfo = namedtuple('ClassInfo', ('db_id', 'name', 'term', 'crn', 'id',
                                      'section', 'seat_cap', 'seat_act',
@@ -53,6 +66,28 @@ class ConfigReader:
         return value
 
 
+def get_bool(value):
+    try:
+        return constants.CONFIG_BOOLEANS[
+            value.lower() if isinstance(value, str) else value]
+    except KeyError:
+        raise ValueError('invalid boolean value: {0!r}'.format(value))
+
+
+def get_mapping(value):
+    # mappings passed as environment variables arrive as YAML or JSON text
+    if isinstance(value, str):
+        try:
+            value = yaml.safe_load(value)
+        except yaml.YAMLError:
+            raise ValueError('invalid mapping value: {0!r}'.format(value))
+        if value is None:
+            return {}
+    if not isinstance(value, dict):
+        raise ValueError('invalid mapping value: {0!r}'.format(value))
+    return value
+
+
 def get_term_and_crn_from_match(match):
     get_group = match.group
     crn_groups = constants.REGEX_CLASS_CRN_GROUPS
@@ -89,18 +124,70 @@ def pluralize(word, num):
     return word
 
 
-async def notify(user_id, summary, description=None):
+async def get_dm_channel(user_id):
+    try:
+        return dm_channels[user_id]
+    except KeyError:
+        pass
     try:
         user = users[user_id]
     except KeyError:
         user = await client.fetch_user(user_id)
         users[user_id] = user
-    message = await user.send(summary)
+    channel = user.dm_channel
+    if channel is None:
+        channel = await user.create_dm()
+    dm_channels[user_id] = channel
+    return channel
+
+
+async def prewarm_dm_channels(user_ids):
+    semaphore = asyncio.Semaphore(int(config.user_cache_prewarm_concurrency))
+
+    async def prewarm(user_id):
+        async with semaphore:
+            await get_dm_channel(user_id)
+
+    missing = [user_id for user_id in user_ids if user_id not in dm_channels]
+    if missing:
+        logger.debug(constants.LOG_MSG_USER_CACHE_PREWARM, len(missing))
+        await asyncio.gather(*map(prewarm, missing), return_exceptions=True)
+
+
+@monitor.instrumented
+async def notify(user_id, summary, description=None, trace=None):
+    if trace is None:
+        trace = tracing.Trace()
+    channel = await get_dm_channel(user_id)
+    with trace.span('notify.send', user_id=user_id):
+        message = await channel.send(summary)
     if description is not None:
-        await message.edit(content=description)
+        with trace.span('notify.edit', user_id=user_id):
+            await message.edit(content=description)
+    trace.delivered(user_id=user_id)
+
+
+def send_notification(user_id, summary, description=None, trace=None):
+    asyncio.ensure_future(notify(user_id, summary, description, trace))
+
+
+async def notify_all(user_ids, summary, description=None, trace=None,
+                     course_db_id=None):
+    if trace is None:
+        trace = tracing.Trace()
+    with trace.span('prewarm', users=len(user_ids)):
+        await prewarm_dm_channels(user_ids)
+    for user_id in user_ids:
+        if course_db_id is None:
+            send_notification(user_id, summary, description, trace)
+        else:
+            debounce.deliver(user_id, course_db_id, summary, description,
+                             trace)
 
 
-def dispatch_notifications(class_info):
+def dispatch_notifications(class_info, trace=None):
+    if trace is None:
+        trace = tracing.Trace()
     fmt_params = class_info._asdict()
     seat_or_waitlist = constants.MSG_PARAM_SEAT
 
@@ -118,18 +205,51 @@ def dispatch_notifications(class_info):
     summary = constants.USER_MSG_NOTIFICATION_SUMMARY.format(**fmt_params)
     description = constants.USER_MSG_NOTIFICATION_DESCRIPTION.format(
         **fmt_params)
-    for user_id, in db.execute(constants.SQL_GET_USERS_TO_NOTIFY,
-                               (class_info.db_id,)):
-        asyncio.ensure_future(notify(user_id, summary, description))
+    with trace.span('dispatch'):
+        user_ids = [user_id for user_id, in db.execute(
+            constants.SQL_GET_USERS_TO_NOTIFY, (class_info.db_id,))]
+    asyncio.ensure_future(notify_all(user_ids, summary, description, trace,
+                                     class_info.db_id))
+
+
+def get_class_info_from_catalog(school_id, crn, term):
+    entry = catalog.lookup(db, school_id, term, crn)
+    if entry is None:
+        return None
+    name, course_id, section, seat_cap, seat_act, seat_rem, wait_cap, \
+        wait_act, wait_rem, seats_updated_seconds_ago = entry
+    with db:
+        id_in_db = db.execute(constants.SQL_CREATE_CLASS_WITH_AGE, (
+            school_id, term, crn, name, course_id, section, seat_cap,
+            seat_act, seat_rem, wait_cap, wait_act, wait_rem,
+            seats_updated_seconds_ago
+        )).lastrowid
+    if seats_updated_seconds_ago > config.seat_data_max_age:
+        asyncio.ensure_future(refresh_catalog_course(id_in_db))
+    return ClassInfo(id_in_db, name, term, crn, course_id, section, seat_cap,
+                     seat_act, seat_rem, wait_cap, wait_act, wait_rem,
+                     seats_updated_seconds_ago)
+
+
+async def refresh_catalog_course(course_db_id):
+    try:
+        await get_class_info(id_in_db=course_db_id, force_refresh=True,
+                             priority=scheduler.BACKGROUND)
+    except scheduler.Busy:
+        # the course is refreshed again the next time it is looked up
+        metrics.increment('catalog.refreshes_shed')
 
 
+@monitor.instrumented
 async def get_class_info(school_id=None, crn=None, term=None, session=None,
-                         id_in_db=None, force_refresh=False):
+                         id_in_db=None, force_refresh=False,
+                         priority=scheduler.INTERACTIVE):
     if term is None:
         term = banner.get_default_term()
     cached_seat_rem = None
     cached_wait_rem = None
     notification_required = False
+    trace = None
     try:
         if id_in_db is None:
             id_in_db, name, course_id, section, seat_cap, seat_act, seat_rem, \
@@ -154,16 +274,24 @@ async def get_class_info(school_id=None, crn=None, term=None, session=None,
                              .format(school_id, term, crn,
                                      seats_updated_seconds_ago))
     except (StopIteration, ValueError):
+        if id_in_db is None and not force_refresh:
+            result = get_class_info_from_catalog(school_id, crn, term)
+            if result is not None:
+                return result
         banner_url, = next(db.execute(constants.SQL_GET_SCHOOL_URL,
                                       (school_id,)))
-        class_info = await banner.get_class_info(banner_url, crn, term=term,
-                                                 session=session)
+        trace = tracing.Trace(school_id=school_id, term=term, crn=crn)
+        with trace.span('fetch'):
+            class_info = await banner.get_class_info(
+                banner_url, crn, term=term, session=session,
+                priority=priority)
         if class_info is None:
             return None
         name, _, course_id, section, seat_cap, seat_act, seat_rem, wait_cap, \
             wait_act, wait_rem = class_info
         seats_updated_seconds_ago = 0
-        with db:
+        with trace.span('diff'), db:
+            catalog.store_seats(db, school_id, term, class_info)
             if id_in_db is None:
                 id_in_db = db.execute(constants.SQL_CREATE_CLASS, (
                     school_id, term, crn, name, course_id, section, seat_cap,
@@ -175,31 +303,196 @@ async def get_class_info(school_id=None, crn=None, term=None, session=None,
                 db.execute(constants.SQL_UPDATE_SEAT_INFO, (
                     name, course_id, section, seat_cap, seat_act, seat_rem,
                     wait_cap, wait_act, wait_rem, id_in_db))
+                if notification_required and not cluster.has_discord():
+                    # queued in the same transaction as the new seats, so
+                    # if the database is busy both are retried by the next
+                    # refresh
+                    cluster.enqueue_notification(
+                        db, id_in_db, (cached_seat_rem, cached_wait_rem),
+                        trace.trace_id, trace.start)
     result = ClassInfo(id_in_db, name, term, crn, course_id, section, seat_cap,
                        seat_act, seat_rem, wait_cap, wait_act, wait_rem,
                        seats_updated_seconds_ago)
     if notification_required:
-        dispatch_notifications(result)
+        trace.commit()
+        if cluster.has_discord():
+            debounce.submit(result, (cached_seat_rem, cached_wait_rem), trace)
     return result
 
 
+def get_class_info_by_id(course_db_id):
+    try:
+        school_id, crn, term, name, course_id, section, seat_cap, seat_act, \
+            seat_rem, wait_cap, wait_act, wait_rem, \
+            seats_updated_seconds_ago = next(db.execute(
+                constants.SQL_GET_SEATS_BY_CLASS_ID, (course_db_id,)))
+    except StopIteration:
+        return None
+    return ClassInfo(course_db_id, name, term, crn, course_id, section,
+                     seat_cap, seat_act, seat_rem, wait_cap, wait_act,
+                     wait_rem, seats_updated_seconds_ago)
+
+
+async def notification_relay():
+    while True:
+        try:
+            notifications = cluster.dequeue_notifications(db)
+        except sqlite3.OperationalError as e:
+            # the database is busy; the notifications stay queued
+            logger.warning(constants.LOG_MSG_CLUSTER_DB_BUSY, e)
+            notifications = []
+        for course_db_id, previous_seat_rem, previous_wait_rem, trace_id, \
+                created in notifications:
+            class_info = get_class_info_by_id(course_db_id)
+            if class_info is None:
+                continue
+            trace = debounce.resume_trace(trace_id, created, course_db_id)
+            if previous_seat_rem is None:
+                # queued by a poller that did not record the previous seats
+                dispatch_notifications(class_info, trace)
+            else:
+                debounce.submit(class_info,
+                                (previous_seat_rem, previous_wait_rem), trace)
+        await asyncio.sleep(float(config.notification_queue_poll_interval))
+
+
+async def refresh_watched_course(course_db_id, session):
+    refreshing.add(course_db_id)
+    try:
+        await get_class_info(id_in_db=course_db_id, force_refresh=True,
+                             session=session, priority=scheduler.BACKGROUND)
+    finally:
+        refreshing.discard(course_db_id)
+
+
+def load_watched_courses():
+    global watched_courses_version
+    if cluster.is_clustered():
+        watched_courses_version = cluster.get_watchlist_version(db)
+    previous = set(watched_courses)
+    watched_courses.clear()
+    watched_courses.update(dict(db.execute(
+        constants.SQL_COUNT_WATCHED_COURSES)))
+    for course_db_id in previous.difference(watched_courses):
+        debounce.forget(course_db_id)
+    # spread the first refresh of courses without a known due time over a
+    # whole polling interval instead of refreshing them all at once
+    interval = float(config.seat_data_max_age)
+    now = time.time()
+    for course_db_id in watched_courses:
+        if course_db_id not in next_due:
+            schedule_refresh(course_db_id,
+                             now + random.uniform(0, interval))
+
+
+def watch_course(course_db_id):
+    watched_courses[course_db_id] += 1
+    if course_db_id not in next_due:
+        schedule_refresh(course_db_id,
+                         time.time() + float(config.seat_data_max_age))
+
+
+def unwatch_course(course_db_id):
+    watched_courses[course_db_id] -= 1
+    if watched_courses[course_db_id] <= 0:
+        del watched_courses[course_db_id]
+        next_due.pop(course_db_id, None)
+        debounce.forget(course_db_id)
+
+
+def schedule_refresh(course_db_id, due):
+    next_due[course_db_id] = due
+    heapq.heappush(due_queue, (due, course_db_id))
+
+
+def get_watch_state():
+    return [[course_db_id, due] for course_db_id, due in next_due.items()]
+
+
+def restore_watch_state(state):
+    interval = float(config.seat_data_max_age)
+    now = time.time()
+    for course_db_id, due in state:
+        if due < now:
+            # keep the course on its original cadence
+            due += math.ceil((now - due) / interval) * interval
+        schedule_refresh(course_db_id, due)
+
+
+def get_due_courses():
+    interval = float(config.seat_data_max_age)
+    now = time.time()
+    while due_queue and due_queue[0][0] <= now:
+        due, course_db_id = heapq.heappop(due_queue)
+        if next_due.get(course_db_id) != due:
+            continue
+        if course_db_id not in watched_courses:
+            del next_due[course_db_id]
+            continue
+        due += interval
+        if due <= now:
+            due = now + interval
+        schedule_refresh(course_db_id, due)
+        yield course_db_id
+
+
+@monitor.instrumented
 async def watch_iteration():
     logger.debug(constants.LOG_MSG_WATCHER_LOOP_ITERATION_START)
-    async with http.create_aiohttp_session() as session:
-        tasks = []
-        for course_db_id, in db.execute(constants.SQL_GET_WATCHED_COURSES):
-            tasks.append(asyncio.ensure_future(get_class_info(
-                id_in_db=course_db_id, force_refresh=True, session=session)))
-            logger.debug(constants.LOG_MSG_WATCHER_LOOP_DISPATCH.format(
-                course_db_id))
-        await asyncio.gather(*tasks, return_exceptions=True)
+    # pollers never edit the watchlist themselves, so pick up changes made
+    # by the notifier
+    if not cluster.has_discord() and (cluster.get_watchlist_version(db)
+                                      != watched_courses_version):
+        load_watched_courses()
+    course_db_ids = []
+    for course_db_id in get_due_courses():
+        if not cluster.owns(course_db_id):
+            continue
+        if course_db_id in refreshing:
+            metrics.increment('watcher.skipped_in_flight')
+            continue
+        course_db_ids.append(course_db_id)
+    if course_db_ids:
+        async with http.create_aiohttp_session() as session:
+            tasks = []
+            for course_db_id in course_db_ids:
+                tasks.append(asyncio.ensure_future(
+                    refresh_watched_course(course_db_id, session)))
+                logger.debug(constants.LOG_MSG_WATCHER_LOOP_DISPATCH,
+                             course_db_id)
+            await asyncio.gather(*tasks, return_exceptions=True)
     logger.debug(constants.LOG_MSG_WATCHER_LOOP_ITERATION_END)
 
 
 async def watcher():
     while True:
         asyncio.ensure_future(watch_iteration())
-        await asyncio.sleep(config.seat_data_max_age)
+        await asyncio.sleep(float(config.watcher_tick_interval))
+
+
+def save_state():
+    checkpoint.save(state_file, {
+        'watch': get_watch_state(),
+        'policy': policy.get_state(),
+        'notifications': debounce.get_state(),
+    })
+    logger.info(constants.LOG_MSG_STATE_SAVED, state_file,
+                len(next_due), debounce.get_pending_count())
+
+
+def restore_state(state):
+    age = time.time() - state.get('saved_at', 0)
+    restore_watch_state(state.get('watch', []))
+    policy.restore_state(state.get('policy', {}))
+    # notifications held back for longer than a polling interval are stale;
+    # the watcher will pick up whatever changed in the meantime. Pollers
+    # cannot deliver them at all.
+    debounce.restore_state(
+        state.get('notifications', {}), get_class_info_by_id,
+        restore_pending=(cluster.has_discord()
+                         and age <= float(config.seat_data_max_age)))
+    logger.info(constants.LOG_MSG_STATE_RESTORED, state_file,
+                len(next_due), debounce.get_pending_count(), age)
 
 
 class Conversation:
@@ -246,9 +539,13 @@ class Conversation:
     async def reset_confirm_state(self):
         if self.msg_lc_content == 'reset':
             with db:
+                course_db_ids = [course_db_id for course_db_id, in db.execute(
+                    constants.SQL_GET_USER_WATCHED_COURSES, (self.user_id,))]
                 db.execute(
                     constants.SQL_RESET_USER_WATCHLIST, (self.user_id,)
                 ).execute(constants.SQL_DELETE_USER, (self.user_id,))
+            for course_db_id in course_db_ids:
+                unwatch_course(course_db_id)
             self.user_id = None
             await self.reply(constants.USER_MSG_RESET_DONE)
             return type(self).HELLO
@@ -305,6 +602,7 @@ class Conversation:
                     with db:
                         db.execute(constants.SQL_ADD_TO_WATCHLIST,
                                    (self.user_id, class_info.db_id))
+                    watch_course(class_info.db_id)
                 else:
                     message = constants.USER_MSG_CLASS_ALREADY_ON_WATCHLIST
                 fmt_params = class_info._asdict()
@@ -333,6 +631,7 @@ class Conversation:
                     with db:
                         db.execute(constants.SQL_REMOVE_FROM_WATCHLIST,
                                    (watchlist_record,))
+                    unwatch_course(class_info.db_id)
                 fmt_params = class_info._asdict()
                 fmt_params['human_term'] = get_human_readable_term(
                     class_info.term)
@@ -343,6 +642,10 @@ class Conversation:
             else:
                 await self.reply(constants.USER_MSG_CLASS_NOT_FOUND)
             return
+        match = constants.CMD_SEARCH.match(self.msg_content)
+        if match:
+            await self.search(match.group(1), int(match.group(2) or 1))
+            return
         match = constants.CMD_WATCHLIST.match(self.msg_content)
         if match:
             watchlist = []
@@ -371,6 +674,44 @@ class Conversation:
             return
         await self.reply(constants.USER_MSG_INVALID_COMMAND)
 
+    async def search(self, query, page):
+        if not catalog.search_available:
+            await self.reply(constants.USER_MSG_SEARCH_UNAVAILABLE)
+            return
+        term = banner.get_default_term()
+        page = max(page, 1)
+        total, results = catalog.search(db, self.school_id, term, query,
+                                        page=page)
+        if not results:
+            await self.reply(constants.USER_MSG_SEARCH_NO_RESULTS, query,
+                             get_human_readable_term(term))
+            return
+        lines = []
+        for term, crn, name, course_id, section, seat_cap, seat_rem, \
+                wait_cap, wait_rem in results:
+            if seat_rem is None:
+                lines.append(constants.USER_MSG_SEARCH_ENTRY_NO_SEATS.format(
+                    id=course_id, section=section, name=name, crn=crn))
+                continue
+            seat_or_waitlist = constants.MSG_PARAM_SEAT
+            if seat_rem <= 0 and wait_cap > 0:
+                seat_cap = wait_cap
+                seat_rem = wait_rem
+                seat_or_waitlist = constants.MSG_PARAM_WAITLIST_SPOT
+            lines.append(constants.USER_MSG_SEARCH_ENTRY.format(
+                id=course_id, section=section, name=name, crn=crn,
+                seat_cap=seat_cap, seat_rem=seat_rem,
+                seat_or_waitlist_cap=pluralize(seat_or_waitlist, seat_cap),
+            ))
+        start = (page - 1) * constants.SEARCH_PAGE_SIZE + 1
+        lines.insert(0, constants.USER_MSG_SEARCH_RESULTS.format(
+            start, start + len(results) - 1, total, query,
+            get_human_readable_term(term)))
+        if start + len(results) - 1 < total:
+            lines.append(constants.USER_MSG_SEARCH_MORE.format(query,
+                                                               page + 1))
+        await self.reply('\n'.join(lines))
+
     async def school_name_req_state(self):
         if await self.check_reset():
             return
@@ -387,9 +728,7 @@ class Conversation:
             db.execute(constants.SQL_SET_USER_SCHOOL_ID,
                        (self.school_id, self.user_id))
         if self.banner_base_url is None:
-            if not autodetect_fail:
-                self.banner_base_url = await banner.autodiscover(
-                    self.school_name)
+            self.banner_base_url = await banner.autodiscover(self.school_name)
             if self.banner_base_url is not None:
                 logger.info(constants.LOG_MSG_BANNER_URL_AUTODISCOVER_SUCCESS,
                             self.school_name, self.banner_base_url)
@@ -469,7 +808,8 @@ class Conversation:
 
     def __await__(self):
         while True:
-            new_state = yield from self.run_state().__await__()
+            new_state = yield from monitor.timed(
+                self.run_state()).__await__()
             if new_state is not None:
                 self.state = new_state
             if self.user_id is not None:
@@ -485,12 +825,10 @@ class Conversation:
             ).__await__()
 
 
-@client.event
 async def on_ready():
     logger.info(constants.LOG_MSG_READY, client.user.name, client.user.id)
 
 
-@client.event
 async def on_message(message):
     if message.author == client.user:
         return
@@ -500,12 +838,20 @@ async def on_message(message):
         return
     if message.author.id not in users:
         users[message.author.id] = message.author
+        dm_channels[message.author.id] = message.channel
     if message.author.id not in conversations:
+        if scheduler.overloaded():
+            metrics.increment('conversations.shed')
+            await message.channel.send(constants.USER_MSG_BUSY)
+            return
         try:
             conversations.add(message.author.id)
             await Conversation(message)
         except concurrent.futures.CancelledError:
             pass
+        except scheduler.Busy:
+            metrics.increment('conversations.shed')
+            await message.channel.send(constants.USER_MSG_BUSY)
         except Exception:
             logger.exception('conversation with Discord user with ID {0!s} '
                              'raised an error', message.author.id)
@@ -515,14 +861,74 @@ async def on_message(message):
                 conversations.remove(message.author.id)
 
 
+def create_client(loop, client_class=discord.Client):
+    global client
+    client = client_class(loop=loop)
+    client.event(on_ready)
+    client.event(on_message)
+    return client
+
+
+def initialize():
+    global db
+    global users
+    global dm_channels
+    global state_file
+    http.init(config.http_mode, config.http_archive,
+              float(config.http_replay_speed))
+    users = cache.LRUCache(int(config.user_cache_size),
+                           ttl=float(config.user_cache_ttl))
+    dm_channels = cache.LRUCache(int(config.user_cache_size),
+                                 ttl=float(config.user_cache_ttl))
+    db = sqlite3.connect(config.db_file,
+                         timeout=float(config.db_busy_timeout))
+    maintenance.init(db)
+    db.executescript(constants.SQL_INITIALIZE)
+    cluster.init(db, config.role, config.worker_id,
+                 int(config.partitions), float(config.worker_lease_ttl))
+    catalog.search_init(db)
+    banner.autodiscovery_init(
+        config.google_api_token, config.google_cse_id,
+        config.google_cse_base_url,
+        float(config.autodiscovery_positive_ttl),
+        float(config.autodiscovery_negative_ttl),
+        int(config.autodiscovery_cache_size),
+        float(config.banner_probe_timeout),
+        int(config.banner_probe_concurrency),
+        float(config.google_cse_timeout))
+    if config.trace_file:
+        tracing.init(config.trace_file, int(config.trace_file_max_bytes),
+                     int(config.trace_file_backup_count))
+    scheduler.init(int(config.fetch_workers),
+                   int(config.fetch_reserved_workers),
+                   int(config.fetch_interactive_queue_size),
+                   int(config.fetch_background_queue_size))
+    policy.init(get_mapping(config.banner_request_policy),
+                get_mapping(config.banner_host_request_policies))
+    debounce.init(dispatch_notifications, send_notification,
+                  config.notification_mode,
+                  int(config.notification_min_change),
+                  float(config.notification_settle_window),
+                  float(config.notification_user_interval))
+    state_file = config.state_file.format(
+        worker_id=config.worker_id or config.role)
+    if state_file:
+        state = checkpoint.load(state_file)
+        if state is not None:
+            restore_state(state)
+    load_watched_courses()
+    monitor.init(float(config.slow_step_threshold))
+
+
 def environ_getter(key):
     return os.environ[key.upper()]
 
 
 def main():
-    global db
     global config
-    loop = asyncio.get_event_loop()
+    loop = None
+    log_listener = None
+    watching = False
     try:
         parser = argparse.ArgumentParser(description=constants.DESCRIPTION)
         parser.add_argument('config_file', type=argparse.FileType('r'),
@@ -530,11 +936,23 @@ def main():
         parser.add_argument('--color', help=constants.ARG_HELP_COLOR)
         parser.add_argument('--log-level', help=constants.ARG_HELP_LOG_LEVEL)
         parser.add_argument('--db-file', help=constants.ARG_HELP_DB_FILE)
+        parser.add_argument('--log-json', action='store_const', const=True,
+                            help=constants.ARG_HELP_LOG_JSON)
+        parser.add_argument('--log-queue', action='store_const', const=True,
+                            help=constants.ARG_HELP_LOG_QUEUE)
+        parser.add_argument('--http-mode', help=constants.ARG_HELP_HTTP_MODE)
+        parser.add_argument('--http-archive',
+                            help=constants.ARG_HELP_HTTP_ARCHIVE)
+        parser.add_argument('--runtime', help=constants.ARG_HELP_RUNTIME)
+        parser.add_argument('--role', help=constants.ARG_HELP_ROLE)
+        parser.add_argument('--worker-id', help=constants.ARG_HELP_WORKER_ID)
         args = parser.parse_args()
         config_file = yaml.safe_load(args.config_file)
         config = ConfigReader(functools.partial(getattr, args), environ_getter,
                               config_file.__getitem__,
                               constants.CONFIG_DEFAULTS.__getitem__)
+        runtime_enabled, runtime_missing = runtime.select(config.runtime)
+        loop = asyncio.get_event_loop()
         color = {
             'always': True,
             'auto': sys.stderr.isatty(),
@@ -547,27 +965,74 @@ def main():
         else:
             log_format = constants.LOG_FORMAT
         log_level = getattr(logging, config.log_level.upper(), None)
-        logging.basicConfig(format=log_format, level=log_level,
-                            style=constants.LOG_FORMAT_STYLE)
-        db = sqlite3.connect(config.db_file)
-        db.executescript(constants.SQL_INITIALIZE)
-        banner.gapi_init(config.google_api_token, config.google_cse_id)
-        asyncio.ensure_future(watcher(), loop=loop)
-        loop.run_until_complete(client.start(config.discord_api_token))
+        log_listener = logutil.configure(
+            log_format, level=log_level, style=constants.LOG_FORMAT_STYLE,
+            use_json=get_bool(config.log_json),
+            use_queue=get_bool(config.log_queue),
+            json_dumps=runtime.dumps)
+        if runtime_enabled:
+            logger.info(constants.LOG_MSG_RUNTIME_ENABLED,
+                        ', '.join(runtime_enabled))
+        if runtime_missing:
+            logger.warning(constants.LOG_MSG_RUNTIME_MISSING,
+                           ', '.join(runtime_missing))
+        initialize()
+        watching = True
+        diagnostics.install(loop, config.diagnostics_dir,
+                            float(config.diagnostics_duration),
+                            int(config.diagnostics_top),
+                            get_bool(config.diagnostics_trace_memory))
+        asyncio.ensure_future(
+            monitor.lag_probe(float(config.lag_probe_interval)), loop=loop)
+        asyncio.ensure_future(
+            metrics.reporter(float(config.metrics_report_interval)),
+            loop=loop)
+        if cluster.is_clustered():
+            cluster.renew(db)
+            asyncio.ensure_future(cluster.heartbeat(
+                db, float(config.worker_heartbeat_interval)), loop=loop)
+        if config.role != 'notifier':
+            asyncio.ensure_future(watcher(), loop=loop)
+        if config.role == 'notifier':
+            asyncio.ensure_future(notification_relay(), loop=loop)
+        if cluster.has_discord():
+            runtime.use_discord_codec()
+            create_client(loop)
+            asyncio.ensure_future(catalog.harvester(db, config), loop=loop)
+            maintenance.convert_auto_vacuum(db)
+            asyncio.ensure_future(maintenance.maintainer(
+                db, config, load_watched_courses), loop=loop)
+            loop.run_until_complete(client.start(config.discord_api_token))
+        else:
+            loop.run_forever()
     except KeyboardInterrupt:
         pass
     finally:
-        loop.run_until_complete(client.close())
-        pending = asyncio.all_tasks(loop=loop)
-        gathered = asyncio.gather(*pending, loop=loop)
-        try:
-            gathered.cancel()
-            loop.run_until_complete(gathered)
-            # suppress warnings about unretrieved exceptions
-            gathered.exception()
-        except:
-            pass
-        loop.close()
+        if watching and state_file:
+            try:
+                save_state()
+            except Exception:
+                logger.exception('failed to save state to {0!s}',
+                                 state_file)
+        if db is not None:
+            cluster.leave(db)
+        if loop is not None:
+            if client is not None:
+                loop.run_until_complete(client.close())
+            loop.run_until_complete(http.close_shared_session())
+            http.close_archive()
+            pending = asyncio.all_tasks(loop=loop)
+            gathered = asyncio.gather(*pending, loop=loop)
+            try:
+                gathered.cancel()
+                loop.run_until_complete(gathered)
+                # suppress warnings about unretrieved exceptions
+                gathered.exception()
+            except:
+                pass
+            loop.close()
+        if log_listener is not None:
+            log_listener.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from . import logutil, constants, banner
+
+logger = logutil.get_logger(__name__)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def init(db):
+    # a new database can use incremental auto-vacuum from the start without
+    # a VACUUM, as long as no table has been created yet
+    page_count, = next(db.execute('PRAGMA page_count'))
+    if not page_count:
+        db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+
+def convert_auto_vacuum(db):
+    # an existing database needs a full VACUUM, which holds the write lock
+    # until it is done, so only the process running the maintainer does this
+    auto_vacuum, = next(db.execute('PRAGMA auto_vacuum'))
+    if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+        return
+    logger.info(constants.LOG_MSG_MAINTENANCE_AUTO_VACUUM)
+    start = time.monotonic()
+    db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    db.execute('VACUUM')
+    logger.info(constants.LOG_MSG_MAINTENANCE_AUTO_VACUUM_DONE,
+                time.monotonic() - start)
+
+
+async def delete_in_slices(db, sql, params, slice_size):
+    deleted = 0
+    while True:
+        with db:
+            count = db.execute(sql, params + (slice_size,)).rowcount
+        deleted += count
+        if count < slice_size:
+            return deleted
+        await asyncio.sleep(0)
+
+
+async def incremental_vacuum(db, slice_size):
+    page_size, = next(db.execute('PRAGMA page_size'))
+    reclaimed = 0
+    while True:
+        free_pages, = next(db.execute('PRAGMA freelist_count'))
+        if not free_pages:
+            return reclaimed
+        db.execute('PRAGMA incremental_vacuum({0:d})'.format(
+            min(free_pages, slice_size))).fetchall()
+        remaining, = next(db.execute('PRAGMA freelist_count'))
+        if remaining >= free_pages:
+            return reclaimed
+        reclaimed += (free_pages - remaining) * page_size
+        await asyncio.sleep(0)
+
+
+async def collect_garbage(db, config, on_watchlist_expired=None):
+    slice_size = int(config.maintenance_slice_size)
+    expired_terms = [term for term, in db.execute(
+        constants.SQL_GET_KNOWN_TERMS) if banner.is_term_over(term)]
+    watchlist_entries = 0
+    catalog_entries = 0
+    for term in expired_terms:
+        watchlist_entries += await delete_in_slices(
+            db, constants.SQL_EXPIRE_WATCHLIST_SLICE, (term,), slice_size)
+        catalog_entries += await delete_in_slices(
+            db, constants.SQL_EXPIRE_CATALOG_SLICE, (term,), slice_size)
+    if watchlist_entries and on_watchlist_expired is not None:
+        on_watchlist_expired()
+    courses = await delete_in_slices(
+        db, constants.SQL_PRUNE_COURSES_SLICE,
+        (int(config.course_cache_max_age),), slice_size)
+    reclaimed = await incremental_vacuum(db, slice_size)
+    db.execute('PRAGMA optimize')
+    logger.info(constants.LOG_MSG_MAINTENANCE_DONE, watchlist_entries, courses,
+                catalog_entries, reclaimed)
+
+
+async def maintainer(db, config, on_watchlist_expired=None):
+    while True:
+        try:
+            await collect_garbage(db, config, on_watchlist_expired)
+        except Exception:
+            logger.exception('database maintenance failed')
+        await asyncio.sleep(float(config.maintenance_interval))
@@ -0,0 +1,94 @@
+import asyncio
+import bisect
+from . import logutil, constants
+from collections import Counter
+
+logger = logutil.get_logger(__name__)
+
+DEFAULT_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1,
+                  2, 5, 10, 20, 60, 120, 300)
+
+_histograms = {}
+_counters = Counter()
+
+
+class Histogram:
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def get_state(self):
+        return {'bounds': list(self.bounds), 'counts': self.counts,
+                'count': self.count, 'total': self.total, 'max': self.max}
+
+    def restore_state(self, state):
+        if tuple(state.get('bounds', ())) != tuple(self.bounds):
+            return
+        self.counts = list(state['counts'])
+        self.count = state['count']
+        self.total = state['total']
+        self.max = state['max']
+
+    def summary(self):
+        if not self.count:
+            return 'n=0'
+        return 'n={0:d} mean={1:.4g} p50<={2:.4g} p90<={3:.4g} ' \
+            'p99<={4:.4g} max={5:.4g}'.format(
+                self.count, self.total / self.count, self.quantile(0.5),
+                self.quantile(0.9), self.quantile(0.99), self.max)
+
+
+def histogram(name, bounds=DEFAULT_BOUNDS):
+    try:
+        return _histograms[name]
+    except KeyError:
+        result = _histograms[name] = Histogram(bounds)
+        return result
+
+
+def get_histograms(prefix):
+    return {name[len(prefix):]: value for name, value in _histograms.items()
+            if name.startswith(prefix)}
+
+
+def increment(name, value=1):
+    _counters[name] += value
+
+
+def get_counter(name):
+    return _counters[name]
+
+
+def report():
+    for name in sorted(_histograms):
+        logger.info(constants.LOG_MSG_METRICS_HISTOGRAM, name,
+                    _histograms[name].summary())
+    for name in sorted(_counters):
+        logger.info(constants.LOG_MSG_METRICS_COUNTER, name, _counters[name])
+
+
+async def reporter(interval):
+    while True:
+        await asyncio.sleep(interval)
+        report()
@@ -0,0 +1,86 @@
+import asyncio
+import functools
+import time
+from . import logutil, constants, metrics
+
+logger = logutil.get_logger(__name__)
+
+_slow_step_threshold = float('inf')
+_stack = []
+
+
+def init(slow_step_threshold):
+    global _slow_step_threshold
+    _slow_step_threshold = slow_step_threshold
+
+
+def _finish_step(frame, start):
+    elapsed = time.perf_counter() - start
+    _stack.pop()
+    if _stack:
+        _stack[-1][1] += elapsed
+    name, child_time = frame
+    self_time = elapsed - child_time
+    metrics.histogram('step.' + name).observe(self_time)
+    if self_time > _slow_step_threshold:
+        path = ' > '.join(f[0] for f in _stack + [frame])
+        logger.warning(constants.LOG_MSG_SLOW_STEP, path, self_time)
+
+
+class TimedAwaitable:
+    __slots__ = ('name', 'awaitable')
+
+    def __init__(self, name, awaitable):
+        self.name = name
+        self.awaitable = awaitable
+
+    def __await__(self):
+        gen = self.awaitable.__await__()
+        send = gen.send
+        value = None
+        while True:
+            frame = [self.name, 0.0]
+            _stack.append(frame)
+            start = time.perf_counter()
+            try:
+                yielded = send(value)
+            except StopIteration as e:
+                _finish_step(frame, start)
+                return e.value
+            except BaseException:
+                _finish_step(frame, start)
+                raise
+            _finish_step(frame, start)
+            try:
+                value = yield yielded
+                send = gen.send
+            except BaseException as e:
+                value = e
+                send = gen.throw
+
+
+def timed(awaitable, name=None):
+    if name is None:
+        name = awaitable.__qualname__
+    return TimedAwaitable(name, awaitable)
+
+
+def instrumented(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return TimedAwaitable(name, func(*args, **kwargs))
+    return wrapper
+
+
+async def lag_probe(interval):
+    loop = asyncio.get_event_loop()
+    lag_histogram = metrics.histogram('loop.lag')
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start - interval, 0)
+        lag_histogram.observe(lag)
+        if lag > _slow_step_threshold:
+            logger.warning(constants.LOG_MSG_LOOP_LAG, lag)
@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import random
+import time
+import aiohttp
+from . import logutil, constants, metrics, scheduler
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+logger = logutil.get_logger(__name__)
+
+RequestPolicy = namedtuple('RequestPolicy', (
+    'connect_timeout', 'read_timeout', 'total_timeout', 'retries',
+    'backoff_base', 'backoff_max', 'hedge_quantile', 'hedge_min_samples'))
+
+INTEGER_OPTIONS = ('retries', 'hedge_min_samples')
+
+_default_policy = RequestPolicy(**constants.BANNER_REQUEST_POLICY_DEFAULTS)
+_host_policies = {}
+
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def parse_options(options):
+    if not isinstance(options, dict):
+        raise ValueError('invalid Banner request policy: {0!r}'.format(
+            options))
+    parsed = {}
+    for key, value in options.items():
+        if key not in RequestPolicy._fields:
+            raise ValueError('invalid Banner request policy option: '
+                             '{0!s}'.format(key))
+        try:
+            parsed[key] = (int if key in INTEGER_OPTIONS else float)(value)
+        except (TypeError, ValueError):
+            raise ValueError('invalid value for Banner request policy option '
+                             '{0!s}: {1!r}'.format(key, value))
+    return parsed
+
+
+def init(default_options, host_options):
+    global _default_policy
+    _default_policy = RequestPolicy(**constants.BANNER_REQUEST_POLICY_DEFAULTS)
+    _default_policy = _default_policy._replace(
+        **parse_options(default_options))
+    if not isinstance(host_options, dict):
+        raise ValueError('invalid Banner host request policies: {0!r}'.format(
+            host_options))
+    _host_policies.clear()
+    for host, options in host_options.items():
+        _host_policies[str(host).lower()] = _default_policy._replace(
+            **parse_options(options))
+
+
+def check_status(resp):
+    # a server error page has no seating table and would look like a course
+    # that does not exist, so fail the attempt and let it be retried
+    if resp.status >= 500:
+        resp.raise_for_status()
+
+
+def get_state():
+    return {host: latency.get_state() for host, latency in
+            metrics.get_histograms('banner.latency.').items()}
+
+
+def restore_state(state):
+    for host, latency in state.items():
+        metrics.histogram('banner.latency.' + host).restore_state(latency)
+
+
+def get_host(url):
+    return (urlsplit(url).hostname or '').lower()
+
+
+def get_policy(host):
+    return _host_policies.get(host, _default_policy)
+
+
+def get_timeout(policy):
+    return aiohttp.ClientTimeout(total=policy.total_timeout,
+                                 sock_connect=policy.connect_timeout,
+                                 sock_read=policy.read_timeout)
+
+
+def get_hedge_delay(host, policy):
+    if not policy.hedge_quantile:
+        return None
+    latency = metrics.histogram('banner.latency.' + host)
+    if latency.count < policy.hedge_min_samples:
+        return None
+    return latency.quantile(policy.hedge_quantile)
+
+
+async def attempt(host, request, timeout):
+    start = time.monotonic()
+    try:
+        result = await request(timeout)
+    except asyncio.TimeoutError:
+        metrics.increment('banner.timeouts.' + host)
+        raise
+    metrics.histogram('banner.latency.' + host).observe(
+        time.monotonic() - start)
+    return result
+
+
+async def hedged_attempt(host, policy, request, timeout):
+    delay = get_hedge_delay(host, policy)
+    if delay is None:
+        return await attempt(host, request, timeout)
+    pending = {asyncio.ensure_future(attempt(host, request, timeout))}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            metrics.increment('banner.hedges.' + host)
+            pending.add(asyncio.ensure_future(
+                attempt(host, request, timeout)))
+        error = None
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def run(url, request, priority=None):
+    host = get_host(url)
+    policy = get_policy(host)
+    timeout = get_timeout(policy)
+    retry = 0
+    while True:
+        try:
+            if priority is None:
+                return await hedged_attempt(host, policy, request, timeout)
+            # each attempt is scheduled on its own so that a fetch worker is
+            # not held while backing off between attempts
+            return await scheduler.run(priority, functools.partial(
+                hedged_attempt, host, policy, request, timeout))
+        except RETRYABLE_ERRORS as e:
+            if retry >= policy.retries:
+                metrics.increment('banner.failures.' + host)
+                raise
+            backoff = random.uniform(0, min(
+                policy.backoff_max, policy.backoff_base * 2 ** retry))
+            retry += 1
+            metrics.increment('banner.retries.' + host)
+            logger.debug(constants.LOG_MSG_BANNER_RETRY, host, e, backoff,
+                         retry, policy.retries)
+            await asyncio.sleep(backoff)
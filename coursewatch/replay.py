@@ -0,0 +1,209 @@
+import asyncio
+import email.message
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+import aiohttp
+from . import logutil, constants
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logutil.get_logger(__name__)
+
+
+def _pairs(value):
+    if value is None:
+        return []
+    if hasattr(value, 'items'):
+        value = value.items()
+    return [(str(k), str(v)) for k, v in value]
+
+
+def canonicalize_request(method, url, params=None, data=None):
+    parts = urlsplit(str(url))
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query.extend(_pairs(params))
+    query = sorted((k, v) for k, v in query
+                   if k not in constants.HTTP_ARCHIVE_REDACTED_PARAMS)
+    canonical_url = urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                                parts.path, urlencode(query), ''))
+    body = urlencode(sorted(_pairs(data))) if isinstance(
+        data, (dict, list, tuple)) else ''
+    key = hashlib.sha1('{0!s} {1!s}\n{2!s}'.format(
+        method.upper(), canonical_url, body).encode()).hexdigest()
+    return key, canonical_url, body
+
+
+class Archive:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(constants.SQL_INITIALIZE_HTTP_ARCHIVE)
+        self.cursors = {}
+
+    def record(self, method, url, params, data, status, headers, content,
+               elapsed):
+        key, canonical_url, body = canonicalize_request(method, url, params,
+                                                        data)
+        with self.db:
+            self.db.execute(constants.SQL_RECORD_HTTP_EXCHANGE, (
+                key, method.upper(), canonical_url, body, status,
+                json.dumps(headers), zlib.compress(content), elapsed,
+                time.time()))
+
+    def lookup(self, method, url, params, data):
+        key, _, _ = canonicalize_request(method, url, params, data)
+        try:
+            ids, position = self.cursors[key]
+        except KeyError:
+            ids = [exchange_id for exchange_id, in self.db.execute(
+                constants.SQL_GET_HTTP_EXCHANGE_IDS, (key,))]
+            position = 0
+        if not ids:
+            return None
+        self.cursors[key] = (ids, (position + 1) % len(ids))
+        status, headers, content, elapsed = next(self.db.execute(
+            constants.SQL_GET_HTTP_EXCHANGE, (ids[position],)))
+        return status, json.loads(headers), zlib.decompress(content), elapsed
+
+    def close(self):
+        self.db.close()
+
+
+class ReplayStream:
+    def __init__(self, content):
+        self._content = content
+        self._position = 0
+
+    async def read(self, n=-1):
+        if n < 0:
+            n = len(self._content) - self._position
+        chunk = self._content[self._position:self._position + n]
+        self._position += len(chunk)
+        return chunk
+
+    async def iter_chunked(self, n):
+        while True:
+            chunk = await self.read(n)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ReplayResponse:
+    def __init__(self, method, url, status, headers, content):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.content = ReplayStream(content)
+        self._body = content
+
+    @property
+    def charset(self):
+        message = email.message.Message()
+        message['Content-Type'] = self.headers.get('Content-Type', '')
+        return message.get_content_charset()
+
+    def get_encoding(self):
+        return self.charset or 'utf-8'
+
+    async def read(self):
+        return self._body
+
+    async def text(self, encoding=None):
+        return self._body.decode(encoding or self.get_encoding(), 'replace')
+
+    async def json(self, **kwargs):
+        return json.loads(await self.text())
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientError('{0!s} {1!s} returned HTTP {2!s}'
+                                      .format(self.method, self.url,
+                                              self.status))
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class _RequestContextManager:
+    def __init__(self, coro):
+        self._coro = coro
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class _ArchiveSession:
+    closed = False
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        return _RequestContextManager(self._request(method, url, **kwargs))
+
+    async def close(self):
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+
+class RecordingSession(_ArchiveSession):
+    def __init__(self, session, archive):
+        self.session = session
+        self.archive = archive
+
+    async def _request(self, method, url, params=None, data=None, **kwargs):
+        start = time.monotonic()
+        async with self.session.request(method, url, params=params, data=data,
+                                        **kwargs) as resp:
+            content = await resp.read()
+            status = resp.status
+            headers = {name: resp.headers[name]
+                       for name in constants.HTTP_ARCHIVE_HEADERS
+                       if name in resp.headers}
+        self.archive.record(method, url, params, data, status, headers,
+                            content, time.monotonic() - start)
+        return ReplayResponse(method, url, status, headers, content)
+
+    async def close(self):
+        await super().close()
+        await self.session.close()
+
+
+class ReplaySession(_ArchiveSession):
+    def __init__(self, archive, speed):
+        self.archive = archive
+        self.speed = speed
+
+    async def _request(self, method, url, params=None, data=None, **kwargs):
+        exchange = self.archive.lookup(method, url, params, data)
+        if exchange is None:
+            logger.warning(constants.LOG_MSG_HTTP_REPLAY_MISS, method, url)
+            return ReplayResponse(method, url, 404, {}, b'')
+        status, headers, content, elapsed = exchange
+        if self.speed > 0:
+            await asyncio.sleep(elapsed / self.speed)
+        return ReplayResponse(method, url, status, headers, content)
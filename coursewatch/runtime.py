@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+MODES = ('default', 'fast')
+
+html_parser = 'html.parser'
+dumps = json.dumps
+loads = json.loads
+
+
+def use_stdlib():
+    global html_parser
+    global dumps
+    global loads
+    asyncio.set_event_loop_policy(None)
+    html_parser = 'html.parser'
+    dumps = json.dumps
+    loads = json.loads
+
+
+def use_uvloop():
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+def use_lxml():
+    global html_parser
+    import lxml  # noqa: F401
+    html_parser = 'lxml'
+
+
+def use_orjson():
+    global dumps
+    global loads
+    import orjson
+
+    def orjson_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    dumps = orjson_dumps
+    loads = orjson.loads
+
+
+FAST_BACKENDS = (
+    ('uvloop', use_uvloop),
+    ('lxml', use_lxml),
+    ('orjson', use_orjson),
+)
+
+
+def use_discord_codec():
+    # discord.py 1.4 encodes gateway payloads and HTTP request bodies with
+    # discord.utils.to_json, which has to return str; decoding stays with
+    # the json module it imports directly
+    if dumps is json.dumps:
+        return
+    import discord.utils
+    discord.utils.to_json = dumps
+
+
+def select(mode):
+    enabled = []
+    missing = []
+    if mode not in MODES:
+        raise ValueError('invalid runtime: {0!s}'.format(mode))
+    use_stdlib()
+    if mode == 'default':
+        return enabled, missing
+    for name, use_backend in FAST_BACKENDS:
+        try:
+            use_backend()
+        except ImportError:
+            missing.append(name)
+        else:
+            enabled.append(name)
+    return enabled, missing
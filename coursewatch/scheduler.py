@@ -0,0 +1,108 @@
+import asyncio
+import time
+from . import logutil, metrics
+from collections import deque
+
+logger = logutil.get_logger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = ('interactive', 'background')
+
+_executor = None
+
+
+class Busy(Exception):
+    pass
+
+
+class PriorityExecutor:
+    def __init__(self, workers, reserved_workers, queue_sizes):
+        self.workers = workers
+        self.background_workers = max(workers - reserved_workers, 1)
+        self.queue_sizes = queue_sizes
+        self.queues = tuple(deque() for _ in PRIORITY_NAMES)
+        self.running_background = 0
+        self.condition = asyncio.Condition()
+        self.tasks = []
+
+    def start(self):
+        self.tasks = [asyncio.ensure_future(self.worker())
+                      for _ in range(self.workers)]
+
+    def overloaded(self, priority=INTERACTIVE):
+        return len(self.queues[priority]) >= self.queue_sizes[priority]
+
+    def has_runnable(self):
+        return bool(self.queues[INTERACTIVE]) or (
+            bool(self.queues[BACKGROUND])
+            and self.running_background < self.background_workers)
+
+    def pop(self):
+        if self.queues[INTERACTIVE]:
+            return INTERACTIVE, self.queues[INTERACTIVE].popleft()
+        self.running_background += 1
+        return BACKGROUND, self.queues[BACKGROUND].popleft()
+
+    async def worker(self):
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(self.has_runnable)
+                priority, (func, future, enqueued) = self.pop()
+            name = PRIORITY_NAMES[priority]
+            try:
+                if future.cancelled():
+                    continue
+                metrics.histogram('scheduler.wait.' + name).observe(
+                    time.monotonic() - enqueued)
+                # running the job as its own task tells a job that raises
+                # CancelledError apart from this worker being cancelled
+                job = asyncio.ensure_future(func())
+                try:
+                    await asyncio.wait((job,))
+                except asyncio.CancelledError:
+                    job.cancel()
+                    future.cancel()
+                    raise
+                error = None if job.cancelled() else job.exception()
+                if future.cancelled():
+                    continue
+                if job.cancelled():
+                    future.cancel()
+                elif error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(job.result())
+            finally:
+                if priority == BACKGROUND:
+                    async with self.condition:
+                        self.running_background -= 1
+                        self.condition.notify()
+
+    async def run(self, priority, func):
+        name = PRIORITY_NAMES[priority]
+        if self.overloaded(priority):
+            metrics.increment('scheduler.rejected.' + name)
+            raise Busy(name)
+        future = asyncio.get_event_loop().create_future()
+        async with self.condition:
+            self.queues[priority].append((func, future, time.monotonic()))
+            self.condition.notify()
+        return await future
+
+
+def init(workers, reserved_workers, interactive_queue_size,
+         background_queue_size):
+    global _executor
+    _executor = PriorityExecutor(workers, reserved_workers,
+                                 (interactive_queue_size,
+                                  background_queue_size))
+    _executor.start()
+
+
+def overloaded(priority=INTERACTIVE):
+    return _executor.overloaded(priority)
+
+
+async def run(priority, func):
+    return await _executor.run(priority, func)
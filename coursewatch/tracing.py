@@ -0,0 +1,68 @@
+import contextlib
+import logging
+import logging.handlers
+import time
+import uuid
+from . import metrics, runtime
+
+_logger = logging.getLogger('coursewatch.traces')
+_logger.propagate = False
+_enabled = False
+
+
+def init(path, max_bytes, backup_count):
+    global _enabled
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _enabled = True
+
+
+def export(record):
+    if _enabled:
+        _logger.info(runtime.dumps(record))
+
+
+class Trace:
+    __slots__ = ('trace_id', 'start', 'attrs', 'spans', 'committed')
+
+    def __init__(self, trace_id=None, start=None, **attrs):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.start = start or time.time()
+        self.attrs = attrs
+        self.spans = []
+        self.committed = False
+
+    def record(self, name, start, duration, attrs):
+        span = {'trace_id': self.trace_id, 'span': name, 'start': start,
+                'duration': duration}
+        span.update(self.attrs)
+        span.update(attrs)
+        if self.committed:
+            export(span)
+        else:
+            self.spans.append(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        start = time.time()
+        perf_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - perf_start
+            metrics.histogram('trace.' + name).observe(duration)
+            self.record(name, start, duration, attrs)
+
+    def commit(self):
+        self.committed = True
+        for span in self.spans:
+            export(span)
+        self.spans = []
+
+    def delivered(self, **attrs):
+        latency = time.time() - self.start
+        metrics.histogram('trace.change_to_delivery').observe(latency)
+        self.record('delivered', self.start, latency, attrs)
@@ -12,16 +12,27 @@ setup(
     packages=['coursewatch'],
     install_requires=[
         'discord.py >=1.4.1, <2.0.0',
-        'google-api-python-client >=1.6.2, <1.7.0',
+        'aiohttp >=3.6.2, <4.0.0',
+        'chardet >=3.0.4, <4.0.0',
         'termcolor >=1.1.0, <2.0.0',
         'tldextract >=2.1.0, <3.0.0',
         'PyYAML >=5.3.1, <6.0.0',
         'beautifulsoup4 >=4.6.0, <5.0.0',
         'humanize >=0.5.1, <0.6.0',
     ],
+    extras_require={
+        'fast': [
+            'uvloop >=0.14.0',
+            'lxml >=4.5.0',
+            'orjson >=3.0.0',
+        ],
+    },
     entry_points={
         'console_scripts': [
             'coursewatch = coursewatch.main:main',
+            'coursewatch-loadtest = coursewatch.loadtest:run',
+            'coursewatch-export = coursewatch.export:run',
+            'coursewatch-benchmark = coursewatch.benchmark:run',
         ]
     },
     zip_safe=True